@@ -4,11 +4,40 @@ JSInterpreter
 A simple JavaScript interpreter - gaagusac - FIUSAC.
 """
 
-from flask import Flask, render_template, url_for, request, jsonify
+from flask import Flask, Response, render_template, url_for, request, jsonify
 import ply.lex as lex
 import ply.yacc as yacc
+import re
 from enum import Enum
 import traceback
+import random
+import math
+import copy
+import os
+import sys
+import hashlib
+import inspect
+import argparse
+import bisect
+import contextlib
+import io
+import pickle
+import zlib
+import time
+import threading
+import types
+import multiprocessing
+import queue
+import atexit
+import json
+import collections
+import logging
+import logging.handlers
+import concurrent.futures
+import sqlite3
+import secrets
+import hmac
+import stat
 
 app = Flask(__name__)
 
@@ -20,50 +49,355 @@ def home():
 
 @app.route("/eval", methods=["POST"])
 def evaluate():
-    olcscript_parser = None
     try:
         # Get the request with a dictionary of values
         request_dict = request.get_json()
-        source_code = request_dict["payload"]
-        # Create the parser
-        olcscript_parser = OLCScriptParser(source_code)
-        ast = olcscript_parser.parse()
-        if len(olcscript_parser.errors) > 0:
-            return jsonify(
-                {
-                    "result": olcscript_parser.errors_as_string,
-                    "errs": (
-                        olcscript_parser.errors_as_string
-                        if len(olcscript_parser.errors) > 0
-                        else ""
-                    ),
-                }
+        error = request_error(request_dict)
+        if error is not None:
+            return error
+        # identical requests share one run, and its response while it is cached
+        return jsonify(response_cache.run(request_dict, admitted_program))
+    except Overloaded as overloaded:
+        return overloaded_response(overloaded)
+    except BaseException:
+        log_sink.error(traceback.format_exc())
+
+
+def admitted_program(request_dict):
+    # runs the program once admission control lets it, see AdmissionControl
+    with admission_control.admit():
+        return execute_program(request_dict)
+
+
+def execute_program(request_dict):
+    # CPU bound programs run in the worker processes when there is a pool
+    if worker_pool is not None:
+        return worker_pool.run(request_dict)
+    return run_program(request_dict)
+
+
+# the longest source a request can have, checked before anything else
+MAX_SOURCE_LENGTH = 1024 * 1024
+
+
+def request_error(request_dict):
+    # the error response for a request that can not be run, or None
+    if not isinstance(request_dict, dict) or not isinstance(
+        request_dict.get("payload"), str
+    ):
+        return jsonify({"error": "the request has no payload with the source"}), 400
+    if len(request_dict["payload"]) > MAX_SOURCE_LENGTH:
+        admission_control.count("too_long")
+        message = f"the source is longer than {MAX_SOURCE_LENGTH} characters"
+        return jsonify({"error": message}), 413
+    seed = request_dict.get("seed")
+    if seed is not None and not isinstance(seed, (int, str)):
+        return jsonify({"error": "the seed must be an integer or a string"}), 400
+    return None
+
+
+def overloaded_response(overloaded):
+    message, retry_after = overloaded.args
+    return jsonify({"error": message}), 503, {"Retry-After": str(retry_after)}
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    # the state of admission control, see AdmissionControl.metrics
+    return jsonify({"admission": admission_control.metrics()})
+
+
+def run_program(request_dict, budget=None, output=None):
+    # Runs the program of an /eval request and returns the response. The
+    # console lines go to output(line) instead of the response when given.
+    source_code = request_dict["payload"]
+    # Parse the program, or load the tree parsed by an earlier request
+    ast, parse_errors = parse_cache.parse(source_code, request_dict.get("parser"))
+    if parse_errors:
+        return {"result": parse_errors, "errs": parse_errors}
+    # A global context
+    global_context = GlobalContext("<global>")
+    # The interpreter
+    olcscript_interpreter = Interpreter(
+        source_code,
+        global_context,
+        "file.olc",
+        random_seed=request_dict.get("seed"),
+        # limits for this run, a request can only make them stricter
+        budget=budget or ExecutionBudget.for_request(request_dict),
+        output=output,
+        # the server log only gets the console of programs in debug mode
+        echo=log_sink if app.debug else None,
+    )
+    optimizer = Optimizer(olcscript_interpreter, global_context)
+    if request_dict.get("optimize", True):
+        ast = optimizer.optimize(ast)
+    result = olcscript_interpreter.visit(ast, global_context)
+    the_result = olcscript_interpreter.log_as_string
+    response = {
+        "result": the_result,
+        "errs": (
+            olcscript_interpreter.errors_as_string
+            if len(olcscript_interpreter.errors) > 0
+            else ""
+        ),
+        "symbols": (
+            olcscript_interpreter.symbols_as_string
+            if len(olcscript_interpreter.symbols) > 0
+            else ""
+        ),
+    }
+    # the debug view tells what the optimizer removed or rewrote
+    if request_dict.get("debug"):
+        response["optimizations"] = optimizer.report_as_string()
+    # another run would print other numbers, see ResponseCache
+    if olcscript_interpreter.used_random:
+        response["random"] = True
+    return response
+
+
+@app.route("/eval/stream", methods=["POST"])
+def evaluate_stream():
+    # Runs the program like /eval and sends its console lines as Server-Sent
+    # Events while it runs: "console" events with a chunk of lines each, then
+    # an "errors" and a "symbols" event, and "end". The program runs in the
+    # worker pool, or on a thread of this process without one, and it stops
+    # once the client goes away.
+    request_dict = request.get_json()
+    error = request_error(request_dict)
+    if error is not None:
+        return error
+    try:
+        started = admission_control.acquire()
+    except Overloaded as overloaded:
+        return overloaded_response(overloaded)
+    stream = ConsoleStream(ExecutionBudget.for_request(request_dict))
+
+    def run():
+        try:
+            stream.run(request_dict)
+        finally:
+            admission_control.release(started)
+
+    # the program starts now and holds its place until it ends, a client that
+    # goes away before reading any event still stops it
+    threading.Thread(target=run, daemon=True).start()
+
+    def events():
+        try:
+            while True:
+                lines = stream.read()
+                if lines is None:
+                    break
+                if lines:
+                    yield server_sent_event("console", "\n".join(lines))
+            response = stream.response
+            yield server_sent_event("errors", response["errs"])
+            yield server_sent_event("symbols", response.get("symbols", ""))
+            yield server_sent_event("end", "")
+        finally:
+            stream.close()
+
+    response = Response(
+        events(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    response.call_on_close(stream.close)
+    return response
+
+
+def server_sent_event(name, data):
+    # every line of the data is a data field, the client joins them again
+    fields = "".join(f"data: {line}\n" for line in data.split("\n"))
+    return f"event: {name}\n{fields}\n"
+
+
+# the most programs a batch can have, and characters all of their sources
+MAX_BATCH = 1000
+MAX_BATCH_SOURCE_LENGTH = 16 * MAX_SOURCE_LENGTH
+
+
+@app.route("/eval/batch", methods=["POST"])
+def evaluate_batch():
+    # Runs many programs in one request: {"programs": [...]} where every item
+    # is a source or an /eval request with its own limits, the other keys of
+    # the body are the defaults of the items. They run at the same time, as
+    # many as there are workers, and share the caches of /eval. The response
+    # is {"results": [...]} with the response of every item in order, or with
+    # "stream": true a line of JSON for every item as it ends, with its index.
+    # Both are sent as the items end, so a client that goes away stops the
+    # batch. Bodies too large to hold the sources are refused before parsing.
+    # JSON takes up to 6 bytes for a character of a source
+    request.max_content_length = 6 * MAX_BATCH_SOURCE_LENGTH + 1024 * 1024
+    body = request.get_json()
+    try:
+        requests = batch_requests(body)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if body.get("stream"):
+
+        def lines():
+            for index, response in run_batch(requests):
+                yield json.dumps({"index": index, **response}) + "\n"
+
+        return Response(lines(), mimetype="application/x-ndjson")
+
+    def document():
+        # the responses in order, each one once those before it ended
+        yield '{"results": ['
+        ended = {}
+        next_index = 0
+        for index, response in run_batch(requests):
+            ended[index] = response
+            while next_index in ended:
+                separator = ", " if next_index else ""
+                yield separator + json.dumps(ended.pop(next_index))
+                next_index += 1
+        yield "]}\n"
+
+    return Response(document(), mimetype="application/json")
+
+
+def run_batch(requests):
+    # yields the index and the response of every item as it ends. A batch has
+    # at most as many items submitted as there are places in admission
+    # control, so the batches coming together do not fill the queue of the
+    # executor with their requests. Closing the generator, once the client went
+    # away, cancels the items not started yet.
+    executor = shared_batch_executor()
+    window = admission_control.limit()
+    items = enumerate(requests)
+    futures = {}
+    try:
+        while True:
+            for index, request_dict in items:
+                futures[executor.submit(run_batch_item, request_dict)] = index
+                if len(futures) >= window:
+                    break
+            if not futures:
+                return
+            done, _ = concurrent.futures.wait(
+                futures, return_when=concurrent.futures.FIRST_COMPLETED
             )
-        # A global context
-        global_context = GlobalContext("<global>")
-        # The interpreter
-        olcscript_interpreter = Interpreter(
-            olcscript_parser.lexer.lexdata, global_context, "file.olc"
-        )
-        result = olcscript_interpreter.visit(ast, global_context)
-        the_result = olcscript_interpreter.log_as_string
-        return jsonify(
-            {
-                "result": the_result,
-                "errs": (
-                    olcscript_interpreter.errors_as_string
-                    if len(olcscript_interpreter.errors) > 0
-                    else ""
-                ),
-                "symbols": (
-                    olcscript_interpreter.symbols_as_string
-                    if len(olcscript_interpreter.symbols) > 0
-                    else ""
-                ),
-            }
-        )
-    except BaseException as e:
-        print(e.with_traceback())
+            for future in done:
+                yield futures.pop(future), future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def run_batch_item(request_dict):
+    # the response of a program of a batch, a failure is the response of its
+    # program only. Items wait for their turn behind the /eval requests.
+    try:
+        return response_cache.run(request_dict, background_program)
+    except Exception:
+        error = traceback.format_exc()
+        log_sink.error(error)
+        return {"result": error, "errs": error}
+
+
+def background_program(request_dict):
+    # runs the program once admission control lets it, with no time limit on
+    # the wait, see AdmissionControl
+    with admission_control.admit(background=True):
+        return execute_program(request_dict)
+
+
+def shared_batch_executor():
+    # the threads of every batch, as many as there are workers, the items of
+    # the batches that come at the same time wait in its queue
+    global batch_executor
+    with batch_executor_lock:
+        if batch_executor is None:
+            batch_executor = concurrent.futures.ThreadPoolExecutor(
+                admission_control.limit()
+            )
+    return batch_executor
+
+
+batch_executor = None
+batch_executor_lock = threading.Lock()
+
+
+@app.route("/jobs", methods=["POST"])
+def create_job():
+    # Runs the program of an /eval request in the background, the answer is
+    # the id of the job to ask /jobs/<id> about
+    request_dict = request.get_json()
+    error = request_error(request_dict)
+    if error is not None:
+        return error
+    try:
+        job_id = submit_job(request_dict)
+    except Overloaded as overloaded:
+        return overloaded_response(overloaded)
+    except (OSError, sqlite3.Error) as e:
+        log_sink.error(f"the job store can not be used: {e}")
+        return jsonify({"error": "jobs are not available"}), 503
+    return (
+        jsonify({"id": job_id, "status": "queued"}),
+        202,
+        {"Location": f"/jobs/{job_id}"},
+    )
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    # the status and the output so far of a job, and its /eval response once
+    # it ended
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({"error": "no such job"}), 404
+    return jsonify(job)
+
+
+@app.route("/jobs/<job_id>", methods=["DELETE"])
+def cancel_job(job_id):
+    # a queued or running job is stopped, an ended one is left as it is
+    job_store.cancel(job_id)
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({"error": "no such job"}), 404
+    return jsonify({"id": job_id, "status": job["status"]})
+
+
+def batch_requests(body):
+    # the /eval requests of a batch
+    if not isinstance(body, dict) or not isinstance(body.get("programs"), list):
+        raise ValueError("a batch is an object with a list of programs")
+    programs = body["programs"]
+    if len(programs) > MAX_BATCH:
+        raise ValueError(f"a batch can have up to {MAX_BATCH} programs")
+    defaults = {
+        key: value for key, value in body.items() if key not in ("programs", "stream")
+    }
+    requests = []
+    source_length = 0
+    for index, program in enumerate(programs):
+        if isinstance(program, str):
+            program = {"payload": program}
+        if not isinstance(program, dict) or not isinstance(program.get("payload"), str):
+            raise ValueError(f"program {index} is not a source or an /eval request")
+        if len(program["payload"]) > MAX_SOURCE_LENGTH:
+            raise ValueError(
+                f"program {index} is longer than {MAX_SOURCE_LENGTH} characters"
+            )
+        source_length += len(program["payload"])
+        if source_length > MAX_BATCH_SOURCE_LENGTH:
+            raise ValueError(
+                f"the sources of a batch can have up to {MAX_BATCH_SOURCE_LENGTH}"
+                " characters"
+            )
+        program = {**defaults, **program}
+        seed = program.get("seed")
+        if seed is not None and not isinstance(seed, (int, str)):
+            raise ValueError(
+                f"the seed of program {index} must be an integer or a string"
+            )
+        requests.append(program)
+    return requests
 
 
 # #########################################################################################
@@ -76,11 +410,195 @@ def evaluate():
 # #########################################################################################
 
 
+# ------------------------------------------------------------------------------------
+#                                 LOG SINKS
+# ------------------------------------------------------------------------------------
+
+
+class LogSink:
+    # Where the interpreter sends what it used to print: the console lines of
+    # the programs run by the server in debug mode, and the errors found by the
+    # lexer and the parser or raised while serving a request. This one drops
+    # everything, the others below print, buffer, or hand them to the logging
+    # module. The sink of a process is chosen with the OLCSCRIPT_LOG_SINK
+    # environment variable, see make_log_sink(), or set with set_log_sink().
+
+    def console(self, line):
+        pass
+
+    def error(self, message):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        # called once the sink is replaced
+        self.flush()
+
+
+class PrintSink(LogSink):
+    # Prints everything to stdout as it comes, the default of the command line
+    def console(self, line):
+        print(line)
+
+    def error(self, message):
+        print(message)
+
+
+class BufferedSink(LogSink):
+    # Writes to a stream, stdout by default, in blocks of about buffer_size
+    # characters instead of a write per line. What is left is written at exit.
+    def __init__(self, stream=None, buffer_size=64 * 1024):
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self.lines = []
+        self.size = 0
+        self.lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def console(self, line):
+        with self.lock:
+            self.lines.append(line)
+            self.size += len(line) + 1
+            if self.size < self.buffer_size:
+                return
+            self.write()
+
+    error = console
+
+    def flush(self):
+        with self.lock:
+            self.write()
+
+    def write(self):
+        if not self.lines:
+            return
+        stream = self.stream or sys.stdout
+        stream.write("\n".join(self.lines) + "\n")
+        stream.flush()
+        self.lines = []
+        self.size = 0
+
+
+class LoggingSink(LogSink):
+    # Logs the console lines at INFO on the "olcscript.console" logger and the
+    # errors at WARNING on "olcscript.errors". The request threads only put
+    # the records on a queue, a thread of the listener formats and writes them
+    # with the handlers given, a StreamHandler to stderr by default. The logger
+    # has the queue of one sink at a time, the last one made.
+    def __init__(self, name="olcscript", handlers=None):
+        self.logger = logging.getLogger(name)
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        for handler in list(self.logger.handlers):
+            if isinstance(handler, logging.handlers.QueueHandler):
+                self.logger.removeHandler(handler)
+        records = queue.SimpleQueue()
+        self.handler = logging.handlers.QueueHandler(records)
+        self.logger.addHandler(self.handler)
+        self.listener = logging.handlers.QueueListener(
+            records, *(handlers or [logging.StreamHandler()])
+        )
+        self.listener.start()
+        atexit.register(self.listener.stop)
+        self.console_logger = self.logger.getChild("console")
+        self.error_logger = self.logger.getChild("errors")
+
+    def console(self, line):
+        self.console_logger.info(line)
+
+    def error(self, message):
+        self.error_logger.warning(message)
+
+    def close(self):
+        # writes what is queued and leaves the logger to the next sink
+        self.logger.removeHandler(self.handler)
+        atexit.unregister(self.listener.stop)
+        self.listener.stop()
+
+
+LOG_SINKS = {
+    "none": LogSink,
+    "print": PrintSink,
+    "buffered": BufferedSink,
+    "logging": LoggingSink,
+}
+
+
+def make_log_sink(name):
+    try:
+        return LOG_SINKS[name]()
+    except KeyError:
+        raise ValueError(
+            f"unknown log sink {name!r}, expected one of {', '.join(LOG_SINKS)}"
+        ) from None
+
+
+def set_log_sink(sink):
+    # replaces the sink of the process, and returns the one it replaced
+    global log_sink
+    previous, log_sink = log_sink, sink
+    previous.close()
+    return previous
+
+
+# the sink of this process, worker processes read the same variable
+log_sink = make_log_sink(os.environ.get("OLCSCRIPT_LOG_SINK", "print"))
+
+
 # ------------------------------------------------------------------------------------
 #                                 ERRORS
 # ------------------------------------------------------------------------------------
 
 
+class SourceLines:
+    # The lines of a program, by number starting at 1. Only the offsets where
+    # every line starts are kept, built the first time they are needed, and
+    # lines and columns are found with a binary search over them. The parser
+    # and the interpreter of a program share one instance.
+
+    last = None
+
+    def __init__(self, source_code):
+        self.source_code = source_code
+        self._starts = None
+
+    @staticmethod
+    def for_source(source_code):
+        lines = SourceLines.last
+        if lines is None or lines.source_code is not source_code:
+            lines = SourceLines.last = SourceLines(source_code)
+        return lines
+
+    @property
+    def starts(self):
+        if self._starts is None:
+            starts = [0]
+            find = self.source_code.find
+            position = find("\n")
+            while position != -1:
+                starts.append(position + 1)
+                position = find("\n", position + 1)
+            self._starts = starts
+        return self._starts
+
+    def __len__(self):
+        return len(self.starts)
+
+    def get(self, line, default=None):
+        starts = self.starts
+        if not isinstance(line, int) or line < 1 or line > len(starts):
+            return default
+        end = starts[line] - 1 if line < len(starts) else len(self.source_code)
+        return self.source_code[starts[line - 1] : end]
+
+    def column(self, position):
+        # the column of an offset into the source, starting at 1
+        line_start = self.starts[bisect.bisect_right(self.starts, position) - 1]
+        return position - line_start + 1
+
+
 def mark_error_location(text, line, column):
     padding = f"{line}:  "
     result = f"{padding}{text}\n"
@@ -208,6 +726,22 @@ class TypeSpec:
         self.base_type = base_type
 
 
+class PredefinedTypeSpec(TypeSpec):
+    # A type spec of Predefined, it can not be changed once made
+    def __init__(self, form, identifier):
+        super().__init__(form)
+        self.identifier = identifier
+        self.attributes = types.MappingProxyType({})
+
+    def immutable(self, *args):
+        raise TypeError(f"predefined type '{self.identifier.name}' can not change")
+
+    set_form = immutable
+    set_identifier = immutable
+    set_attribute = immutable
+    set_base_type = immutable
+
+
 class TypeForm(Enum):
     NUMBER = 1
     FLOAT = 2
@@ -219,6 +753,7 @@ class TypeForm(Enum):
     INTERFACE = 8
     NULL = 9
     UNDEFINED = 10
+    RANGE = 11
 
 
 class TypeKey(Enum):
@@ -226,6 +761,11 @@ class TypeKey(Enum):
 
 
 class Predefined:
+    # The primitive types. They are made once, when the module is loaded, and
+    # every program of the process shares them: values and the interpreter tell
+    # types apart by identity, so they never change. The types declared by a
+    # program, its interfaces, are kept by its GlobalContext.
+
     # predefined types
     number_type = None
     float_type = None
@@ -234,6 +774,7 @@ class Predefined:
     string_type = None
     null_type = None
     undefined_type = None
+    range_type = None
 
     # predefined identifiers
     number_id = None
@@ -243,61 +784,46 @@ class Predefined:
     string_id = None
     null_id = None
     undefined_id = None
+    range_id = None
+
+    # the identifiers by name
+    types = None
 
     @staticmethod
-    def initialize_types(context):
-        # number type
-        Predefined.number_id = context.enter_type("number")
-        Predefined.number_type = TypeFactory.create_type(TypeForm.NUMBER)
-        Predefined.number_type.set_identifier(Predefined.number_id)
-        Predefined.number_id.set_definition(Definition.TYPE)
-        Predefined.number_id.set_type_spec(Predefined.number_type)
-
-        # float type
-        Predefined.float_id = context.enter_type("float")
-        Predefined.float_type = TypeFactory.create_type(TypeForm.FLOAT)
-        Predefined.float_type.set_identifier(Predefined.float_id)
-        Predefined.float_id.set_definition(Definition.TYPE)
-        Predefined.float_id.set_type_spec(Predefined.float_type)
-
-        # boolean type
-        Predefined.boolean_id = context.enter_type("boolean")
-        Predefined.boolean_type = TypeFactory.create_type(TypeForm.BOOLEAN)
-        Predefined.boolean_type.set_identifier(Predefined.boolean_id)
-        Predefined.boolean_id.set_definition(Definition.TYPE)
-        Predefined.boolean_id.set_type_spec(Predefined.boolean_type)
-
-        # char type
-        Predefined.char_id = context.enter_type("char")
-        Predefined.char_type = TypeFactory.create_type(TypeForm.CHAR)
-        Predefined.char_type.set_identifier(Predefined.char_id)
-        Predefined.char_id.set_definition(Definition.TYPE)
-        Predefined.char_id.set_type_spec(Predefined.char_type)
-
-        # string type
-        Predefined.string_id = context.enter_type("string")
-        Predefined.string_type = TypeFactory.create_type(TypeForm.STRING)
-        Predefined.string_type.set_identifier(Predefined.string_id)
-        Predefined.string_id.set_definition(Definition.TYPE)
-        Predefined.string_id.set_type_spec(Predefined.string_type)
-
-        # null type
-        Predefined.null_id = context.enter_type("null")
-        Predefined.null_type = TypeFactory.create_type(TypeForm.NULL)
-        Predefined.null_type.set_identifier(Predefined.null_id)
-        Predefined.null_id.set_definition(Definition.TYPE)
-        Predefined.null_id.set_type_spec(Predefined.null_type)
-
-        # undefined type
-        Predefined.undefined_id = context.enter_type("undefined")
-        Predefined.undefined_type = TypeFactory.create_type(TypeForm.UNDEFINED)
-        Predefined.undefined_type.set_identifier(Predefined.undefined_id)
-        Predefined.undefined_id.set_definition(Definition.TYPE)
-        Predefined.undefined_id.set_type_spec(Predefined.undefined_type)
+    def initialize_types():
+        Predefined.types = SymTab()
+        Predefined.number_id, Predefined.number_type = Predefined.define(
+            "number", TypeForm.NUMBER
+        )
+        Predefined.float_id, Predefined.float_type = Predefined.define(
+            "float", TypeForm.FLOAT
+        )
+        Predefined.boolean_id, Predefined.boolean_type = Predefined.define(
+            "boolean", TypeForm.BOOLEAN
+        )
+        Predefined.char_id, Predefined.char_type = Predefined.define(
+            "char", TypeForm.CHAR
+        )
+        Predefined.string_id, Predefined.string_type = Predefined.define(
+            "string", TypeForm.STRING
+        )
+        Predefined.null_id, Predefined.null_type = Predefined.define(
+            "null", TypeForm.NULL
+        )
+        Predefined.undefined_id, Predefined.undefined_type = Predefined.define(
+            "undefined", TypeForm.UNDEFINED
+        )
+        Predefined.range_id, Predefined.range_type = Predefined.define(
+            "range", TypeForm.RANGE
+        )
 
     @staticmethod
-    def initialize(context):
-        Predefined.initialize_types(context)
+    def define(name, form):
+        type_id = Predefined.types.enter(name)
+        type_spec = TypeFactory.create_predefined_type(form, type_id)
+        type_id.set_definition(Definition.TYPE)
+        type_id.set_type_spec(type_spec)
+        return type_id, type_spec
 
 
 class Definition(Enum):
@@ -316,6 +842,10 @@ class TypeFactory:
     def create_type(form):
         return TypeSpec(form)
 
+    @staticmethod
+    def create_predefined_type(form, identifier):
+        return PredefinedTypeSpec(form, identifier)
+
 
 # ------------------------------------------------------------------------------------
 #                                 SYMBOL TABLE
@@ -372,6 +902,10 @@ class SymtabKey(Enum):
     RUNTIME_VALUE = 1
 
 
+# the primitive types exist once for the whole process
+Predefined.initialize_types()
+
+
 # ------------------------------------------------------------------------------------
 #                                 CONTEXT
 # ------------------------------------------------------------------------------------
@@ -385,8 +919,8 @@ class GlobalContext:
         self.variables = SymTab()
         self.functions = {}
         self.interfaces = {}
+        # the interfaces, the primitive types are in Predefined.types
         self.types = SymTab()
-        Predefined.initialize_types(self)
 
     def enter_interface(self, name, fields):
         self.interfaces[name] = fields
@@ -398,7 +932,7 @@ class GlobalContext:
         return self.types.enter(name)
 
     def lookup_type(self, name):
-        return self.types.lookup(name)
+        return self.types.lookup(name) or Predefined.types.lookup(name)
 
     def enter(self, name):
         return self.variables.enter(name)
@@ -696,6 +1230,8 @@ class ArithmeticOperationNode:
         self.left = left
         self.operator = operator
         self.right = right
+        # True once the node saw operands of different types, it is never quickened again
+        self.is_polymorphic = False
 
         self.line = operator.lineno
         self.column = operator.lexpos
@@ -714,6 +1250,8 @@ class RelationalOperationNode:
         self.left = left
         self.operator = operator
         self.right = right
+        # True once the node saw operands of different types, it is never quickened again
+        self.is_polymorphic = False
 
         self.line = operator.lineno
         self.column = operator.lexpos
@@ -727,6 +1265,26 @@ class RelationalOperationNode:
         pass
 
 
+# Quickened nodes. The interpreter swaps the class of a node after it runs,
+# the specialized visit checks the operand types and falls back otherwise.
+
+
+class IntArithmeticOperationNode(ArithmeticOperationNode):
+    pass
+
+
+class FloatArithmeticOperationNode(ArithmeticOperationNode):
+    pass
+
+
+class StringConcatOperationNode(ArithmeticOperationNode):
+    pass
+
+
+class NumberRelationalOperationNode(RelationalOperationNode):
+    pass
+
+
 class LogicalOperationNode:
     def __init__(self, left, operator, right):
         self.left = left
@@ -1142,6 +1700,19 @@ class BuiltinJoin:
         pass
 
 
+class BuiltinMath:
+    def __init__(self, token, function_name, arguments):
+        self.token = token
+        self.function_name = function_name
+        self.arguments = arguments
+
+        self.line = token.lineno
+        self.column = token.lexpos
+
+    def __repr__(self):
+        pass
+
+
 class ArrayNode:
     def __init__(self, token, elements):
         self.token = token
@@ -1336,6 +1907,92 @@ class TernaryOperationNode:
         pass
 
 
+class DeclarationSymbolNode:
+    # Created by the optimizer for a declaration that is never read
+    def __init__(self, node, type_name):
+        self.token = node.token
+        self.node = node  # the removed VarDeclarationNode
+        self.name = node.identifier_node.token.value
+        self.is_constant = node.is_constant
+        self.type_name = type_name
+
+        self.line = node.line
+        self.column = node.column
+
+    def __repr__(self):
+        pass
+
+
+class HoistedNode:
+    # Created by the optimizer for a loop invariant expression
+    def __init__(self, slot, expr_node):
+        self.slot = slot  # the engine slot that keeps the value
+        self.expr_node = expr_node
+
+        self.line = expr_node.line
+        self.column = expr_node.column
+
+    def __repr__(self):
+        pass
+
+
+class HoistingLoopNode:
+    # Created by the optimizer, empties the slots of a loop before it runs
+    def __init__(self, loop, slots):
+        self.loop = loop
+        self.slots = slots
+
+        self.line = loop.line
+        self.column = loop.column
+
+    def __repr__(self):
+        pass
+
+
+class InlinedCallNode:
+    # Created by the optimizer for a call to a small function
+    def __init__(self, call, function, parameter_forms, return_form, body):
+        self.call = call  # the CallExprNode, it runs whenever a guard fails
+        self.name = call.caller.token.value
+        self.function_token = function.token  # the 'function' token of the callee
+        self.arguments = call.arguments
+        self.parameter_forms = parameter_forms  # a TypeForm for every parameter
+        self.return_form = return_form
+        self.body = body  # the returned expression
+
+        self.line = call.line
+        self.column = call.column
+
+    def __repr__(self):
+        pass
+
+
+class InlinedArgumentNode:
+    # Created by the optimizer, a parameter read inside an inlined function
+    def __init__(self, node, index):
+        self.token = node.token
+        self.index = index
+
+        self.line = node.line
+        self.column = node.column
+
+    def __repr__(self):
+        pass
+
+
+class ConstantNode:
+    # Created by the optimizer, never by the parser
+    def __init__(self, node, value):
+        self.node = node  # the node this constant replaces, kept for error reporting
+        self.value = value  # a prebuilt runtime value
+
+        self.line = node.line
+        self.column = node.column
+
+    def __repr__(self):
+        pass
+
+
 # ------------------------------------------------------------------------------------
 #                                 PARSER
 # ------------------------------------------------------------------------------------
@@ -1344,10 +2001,17 @@ class TernaryOperationNode:
 class OLCScriptParser:
     """Class for a lexer/parser that has the rules defined as methods."""
 
-    def __init__(self, source_code, file=None):
+    # the front end used to parse: "ply" or "pratt" (see PrattParser)
+    FRONT_END = "ply"
+
+    def __init__(self, source_code, file=None, front_end=None):
         """Create an instances of Parser."""
-        self.lexer = lex.lex(module=self)
-        self.parser = yacc.yacc(module=self)
+        self.front_end = front_end or OLCScriptParser.FRONT_END
+        self.lexer = None
+        self.parser = None
+        # the hand written front end only needs PLY to report syntax errors
+        if self.front_end == "ply":
+            self.build_ply()
         self.errors = []
         self.log = []
         self.source_code = source_code
@@ -1355,29 +2019,39 @@ class OLCScriptParser:
         self.file = file or "<stdin>"
         self.errors_as_string = ""
 
+    def build_ply(self):
+        """Build the PLY lexer and parser from the rules."""
+        self.lexer = lex.lex(module=self)
+        self.parser = yacc.yacc(module=self)
+
     def parse(self):
         """Parse a string."""
-        # Parse the input string
-        parse_result = self.parser.parse(self.source_code)
-        # Build a string with the error list
+        parse_result = None
+        if self.front_end == "pratt":
+            try:
+                parse_result = PrattParser(self).parse()
+            except PrattSyntaxError:
+                # PLY parses it again, its error messages and recovery are the reference
+                pass
+        if parse_result is None:
+            if self.parser is None:
+                self.build_ply()
+            # Parse the input string
+            parse_result = self.parser.parse(self.source_code, lexer=self.lexer)
+        # Build a string with the error list, every error was logged when found
         self.errors_as_string = "\n".join([err for err in self.errors])
-        print(self.errors_as_string)
         # Return the parse result, a list of ast nodes.
         return parse_result
 
     def make_source_code_listing(self):
-        listing = {}
-        lines = self.source_code.split("\n")
-        counter = 1
-        for line in lines:
-            listing[counter] = line
-            counter += 1
-        return listing
+        return SourceLines.for_source(self.source_code)
 
     def execute(self):
         context = GlobalContext("<global>")
         ast = self.parse()
-        interpreter = Interpreter(self.lexer.lexdata, context, self.file)
+        interpreter = Interpreter(
+            self.source_code, context, self.file, echo=PrintSink()
+        )
         result = interpreter.visit(ast, context)
 
     def run(self):
@@ -1391,7 +2065,7 @@ class OLCScriptParser:
             if not s:
                 continue
             ast = self.parse(s)
-            interpreter = Interpreter(self.lexer.lexdata)
+            interpreter = Interpreter(self.lexer.lexdata, echo=PrintSink())
             result = interpreter.visit(ast, context)
 
     reserved = {
@@ -1501,7 +2175,7 @@ class OLCScriptParser:
         try:
             t.value = float(t.value)
         except ValueError:
-            print("Float value too large %s" % t.value)
+            log_sink.error("Float value too large %s" % t.value)
             t.value = 0.0
         return t
 
@@ -1510,7 +2184,7 @@ class OLCScriptParser:
         try:
             t.value = int(t.value)
         except ValueError:
-            print("Integer value too large %s" % t.value)
+            log_sink.error("Integer value too large %s" % t.value)
             t.value = 0
         return t
 
@@ -1541,8 +2215,7 @@ class OLCScriptParser:
         t.lexer.lineno += t.value.count("\n")
 
     def find_column(self, token):
-        line_start = self.lexer.lexdata.rfind("\n", 0, token.lexpos) + 1
-        return (token.lexpos - line_start) + 1
+        return self.source_code_listing.column(token.lexpos)
 
     def t_newline(self, t):
         r"\n+"
@@ -1557,7 +2230,7 @@ class OLCScriptParser:
             f"invalid character '{t.value[0]}' found.",
             self.file,
         )
-        print(the_error.as_string())
+        log_sink.error(the_error.as_string())
         self.errors.append(the_error.as_string())
         t.lexer.skip(1)
 
@@ -1579,6 +2252,15 @@ class OLCScriptParser:
     def set_token_column(self, t):
         t.lexpos = self.find_column(t)
 
+    def make_one_token(self, t):
+        # the 1 added by ++ and --, at the position of the operator
+        one = lex.LexToken()
+        one.type = "NUMBER"
+        one.value = 1
+        one.lineno = t.lineno
+        one.lexpos = t.lexpos
+        return one
+
     # ############################### PROGRAM ##########################################
     # this production should be the root node of the ast
     # is a list of statement nodes.
@@ -1868,17 +2550,7 @@ class OLCScriptParser:
     def p_statement_for_update_ppinc_prefix(self, p):
         "for_update : PPINC expression"
         self.set_token_column(p.slice[1])
-        one_obj = type(
-            "",
-            (object,),
-            {
-                "type": "NUMBER",
-                "value": int(1),
-                "lineno": p.slice[1].lineno,
-                "lexpos": p.slice[1].lexpos,
-            },
-        )()
-        one_token = NumberLiteralNode(one_obj)
+        one_token = NumberLiteralNode(self.make_one_token(p.slice[1]))
         p.slice[1].type = "PLUS"
         p.slice[1].value = "+"
         bin_operation = ArithmeticOperationNode(p[2], p.slice[1], one_token)
@@ -1888,17 +2560,7 @@ class OLCScriptParser:
     def p_statement_for_update_ppinc_postfix(self, p):
         "for_update : expression PPINC"
         self.set_token_column(p.slice[2])
-        one_obj = type(
-            "",
-            (object,),
-            {
-                "type": "NUMBER",
-                "value": int(1),
-                "lineno": p.slice[2].lineno,
-                "lexpos": p.slice[2].lexpos,
-            },
-        )()
-        one_token = NumberLiteralNode(one_obj)
+        one_token = NumberLiteralNode(self.make_one_token(p.slice[2]))
         p.slice[2].type = "PLUS"
         p.slice[2].value = "+"
         bin_operation = ArithmeticOperationNode(p[1], p.slice[2], one_token)
@@ -1907,17 +2569,7 @@ class OLCScriptParser:
     def p_statement_for_update_ppdec_prefix(self, p):
         "for_update : PPDEC expression"
         self.set_token_column(p.slice[1])
-        one_obj = type(
-            "",
-            (object,),
-            {
-                "type": "NUMBER",
-                "value": int(1),
-                "lineno": p.slice[1].lineno,
-                "lexpos": p.slice[1].lexpos,
-            },
-        )()
-        one_token = NumberLiteralNode(one_obj)
+        one_token = NumberLiteralNode(self.make_one_token(p.slice[1]))
         p.slice[1].type = "MINUS"
         p.slice[1].value = "-"
         bin_operation = ArithmeticOperationNode(p[2], p.slice[1], one_token)
@@ -1926,17 +2578,7 @@ class OLCScriptParser:
     def p_statement_for_update_ppdec_posfix(self, p):
         "for_update : expression PPDEC"
         self.set_token_column(p.slice[2])
-        one_obj = type(
-            "",
-            (object,),
-            {
-                "type": "NUMBER",
-                "value": int(1),
-                "lineno": p.slice[2].lineno,
-                "lexpos": p.slice[2].lexpos,
-            },
-        )()
-        one_token = NumberLiteralNode(one_obj)
+        one_token = NumberLiteralNode(self.make_one_token(p.slice[2]))
         p.slice[2].type = "MINUS"
         p.slice[2].value = "-"
         bin_operation = ArithmeticOperationNode(p[1], p.slice[2], one_token)
@@ -1944,7 +2586,8 @@ class OLCScriptParser:
 
     # ------------------------------------------ FOR OF --------------------------------------------------------
     def p_statement_forof_loop(self, p):
-        "statement : FOR LPAREN VAR IDENTIFIER OF expression RPAREN block"
+        """statement : FOR LPAREN VAR IDENTIFIER OF expression RPAREN block
+        | FOR LPAREN CONST IDENTIFIER OF expression RPAREN block"""
         self.set_token_column(p.slice[1])
         p[0] = ForOfNode(p.slice[1], p[4], p[6], p[8])
 
@@ -2210,6 +2853,14 @@ class OLCScriptParser:
             self.set_token_column(p.slice[2])
             p[0] = CallExprNode(p[1], p.slice[2], [])
             return
+        if (
+            isinstance(p[1], MemberAccessNode)
+            and isinstance(p[1].left, IdentifierNode)
+            and p[1].left.token.value == "Math"
+        ):
+            self.set_token_column(p.slice[2])
+            p[0] = BuiltinMath(p.slice[2], p[1].right.token.value, [])
+            return
         if p[1].right.token.value == "toString":
             p[0] = BuiltinToString(p[1].right.token, p[1].left)
             return
@@ -2271,6 +2922,14 @@ class OLCScriptParser:
             self.set_token_column(p.slice[2])
             p[0] = ObjectValuesNode(p.slice[2], p[3])
             return
+        if (
+            isinstance(p[1].left, IdentifierNode)
+            and isinstance(p[1].right, IdentifierNode)
+            and p[1].left.token.value == "Math"
+        ):
+            self.set_token_column(p.slice[2])
+            p[0] = BuiltinMath(p.slice[2], p[1].right.token.value, p[3])
+            return
 
         self.set_token_column(p.slice[2])
         p[0] = CallExprNode(p[1], p.slice[2], p[3])
@@ -2296,6 +2955,7 @@ class OLCScriptParser:
             return
 
         self.set_token_column(p.slice[2])
+        self.set_token_column(p.slice[3])
         p[0] = MemberAccessNode(p[1], p.slice[2], IdentifierNode(p.slice[3]))
 
     # foo, bar, baz, ...
@@ -2397,7 +3057,7 @@ class OLCScriptParser:
                 self.file,
             )
             self.errors.append(the_error.as_string())
-            print(the_error.as_string())
+            log_sink.error(the_error.as_string())
         else:
             the_error = InvalidSyntaxError(
                 self.source_code_listing.get(len(self.source_code_listing)),
@@ -2408,49 +3068,864 @@ class OLCScriptParser:
                 self.file,
             )
             self.errors.append(the_error.as_string())
-            print(the_error.as_string())
+            log_sink.error(the_error.as_string())
+
+
+class PrattSyntaxError(Exception):
+    # Raised by PrattParser on any lexical or syntax error
+    pass
+
+
+class Production:
+    # What the PLY rules of OLCScriptParser get as p: p[n] is the value of the
+    # n-th symbol, p.slice[n] the token of a terminal.
+    class Value:
+        __slots__ = ("value",)
+
+        def __init__(self, value):
+            self.value = value
+
+    def __init__(self, symbols):
+        self.slice = [Production.Value(None)] + [
+            symbol if isinstance(symbol, lex.LexToken) else Production.Value(symbol)
+            for symbol in symbols
+        ]
+
+    def __getitem__(self, index):
+        return self.slice[index].value
+
+    def __setitem__(self, index, value):
+        self.slice[index].value = value
+
+    def __len__(self):
+        return len(self.slice)
+
+
+class PrattParser:
+    # A hand written front end for OLCScriptParser: a tokenizer that makes the
+    # same tokens as the PLY lexer, a recursive descent parser for statements
+    # and a Pratt parser for expressions. It accepts the same language and
+    # builds the same tree: literals, names and operators are built here, every
+    # other node by calling the PLY rule of OLCScriptParser that builds it, so
+    # token columns and quirks stay the same. It gives up on the first error,
+    # OLCScriptParser then parses the program again with PLY to report it.
+
+    # blanks, newlines and comments, never given back once matched
+    SKIP_PATTERN = r"(?>(?:[ \t\n]+|//.*|/\*[^*]*\*+(?:[^/*][^*]*\*+)*/)*)"
+    SKIP_REGEX = re.compile(SKIP_PATTERN)
+    # the skipped text and a token, in the order the PLY lexer tries its rules
+    TOKEN_REGEX = re.compile(
+        SKIP_PATTERN + r"""
+        (?:
+        (?P<FLOAT>\d+\.\d+)
+        | (?P<NUMBER>\d+)
+        | (?P<STRING>"(?:\\.|[^"\\])*")
+        | (?P<IDENTIFIER>[a-zA-Z_][a-zA-Z0-9_]*)
+        | (?P<CHAR>'(?:\\.|[^'\\])*')
+        | (?P<OPERATOR>\+\+|\+=|--|-=|\*=|/=|%=|<=|>=|==|!=|&&|\|\||[-+*/%<>=!.;,:(){}\[\]?])
+        )
+        """,
+        re.VERBOSE,
+    )
 
+    OPERATORS = {
+        "++": "PPINC",
+        "+=": "COMPLUS",
+        "--": "PPDEC",
+        "-=": "COMMINUS",
+        "*=": "COMTIMES",
+        "/=": "COMDIVIDE",
+        "%=": "COMMOD",
+        "<=": "LTE",
+        ">=": "GTE",
+        "==": "EQ_EQ",
+        "!=": "BANG_EQ",
+        "&&": "AND",
+        "||": "OR",
+        "+": "PLUS",
+        "-": "MINUS",
+        "*": "TIMES",
+        "/": "DIVIDE",
+        "%": "MOD",
+        "<": "LT",
+        ">": "GT",
+        "=": "EQ",
+        "!": "BANG",
+        ".": "DOT",
+        ";": "SEMICOLON",
+        ",": "COMMA",
+        ":": "COLON",
+        "(": "LPAREN",
+        ")": "RPAREN",
+        "{": "LBRACER",
+        "}": "RBRACER",
+        "[": "LBRACKET",
+        "]": "RBRACKET",
+        "?": "QMARK",
+    }
 
-# ------------------------------------------------------------------------------------
-#                                 VALUES
-# ------------------------------------------------------------------------------------
+    # binding powers, from the precedence table of OLCScriptParser
+    TERNARY_POWER = 1
+    UNARY_POWER = 8
+    BINARY_OPERATORS = {
+        "OR": (2, LogicalOperationNode),
+        "AND": (3, LogicalOperationNode),
+        "EQ_EQ": (4, EqualityOperationNode),
+        "BANG_EQ": (4, EqualityOperationNode),
+        "LT": (5, RelationalOperationNode),
+        "LTE": (5, RelationalOperationNode),
+        "GT": (5, RelationalOperationNode),
+        "GTE": (5, RelationalOperationNode),
+        "PLUS": (6, ArithmeticOperationNode),
+        "MINUS": (6, ArithmeticOperationNode),
+        "TIMES": (7, ArithmeticOperationNode),
+        "DIVIDE": (7, ArithmeticOperationNode),
+        "MOD": (7, ArithmeticOperationNode),
+    }
+    # comparisons can not be chained
+    NONASSOCIATIVE_POWERS = (4, 5)
+
+    LITERALS = {
+        "NUMBER": NumberLiteralNode,
+        "FLOAT": FloatLiteralNode,
+        "STRING": StringLiteralNode,
+        "CHAR": CharLiteralNode,
+        "TRUE": BooleanLiteralNode,
+        "FALSE": BooleanLiteralNode,
+        "NULL": NullLiteralNode,
+        "IDENTIFIER": IdentifierNode,
+    }
 
+    COMPOUND_ASSIGNMENTS = ("COMPLUS", "COMMINUS", "COMTIMES", "COMDIVIDE", "COMMOD")
 
-class Number:
-    def __init__(self, value):
-        self.value = value
-        self.type_spec = (
-            Predefined.number_type if isinstance(value, int) else Predefined.float_type
-        )
-        self.set_pos()
-        self.set_context()
+    def __init__(self, olcscript_parser):
+        self.rules = olcscript_parser
+        self.source_code = olcscript_parser.source_code
+        self.tokens = []
+        # the type of every token, the input ends with '$end'
+        self.types = []
+        self.position = 0
 
-    def get_type_spec(self):
-        return self.type_spec
+    def parse(self):
+        self.tokens = self.tokenize()
+        self.types = [token.type for token in self.tokens]
+        declarations = []
+        while self.peek() != "$end":
+            declarations.append(self.parse_declaration())
+        if not declarations:
+            self.fail()
+        return ProgramNode(declarations)
+
+    # ------------------------------------- tokens -------------------------------------
+
+    def tokenize(self):
+        tokens = []
+        source_code = self.source_code
+        reserved = OLCScriptParser.reserved
+        operators = PrattParser.OPERATORS
+        LexToken = lex.LexToken
+        position = 0
+        lineno = 1
+        count = source_code.count
+        for m in PrattParser.TOKEN_REGEX.finditer(source_code):
+            if m.start() != position:
+                # only a trailing comment or an illegal character is left
+                break
+            kind = m.lastgroup
+            start = m.start(kind)
+            if start != position:
+                # the newlines skipped, the ones inside strings do not count
+                lineno += count("\n", position, start)
+            position = m.end()
+            text = m.group(kind)
+            token = LexToken()
+            token.lineno = lineno
+            token.lexpos = start
+            if kind == "OPERATOR":
+                token.type = operators[text]
+                token.value = text
+            elif kind == "IDENTIFIER":
+                token.type = reserved.get(text, "IDENTIFIER")
+                token.value = text
+            elif kind == "NUMBER":
+                token.type = kind
+                try:
+                    token.value = int(text)
+                except ValueError:
+                    # PLY reports the integer as too large
+                    self.fail()
+            elif kind == "FLOAT":
+                token.type = kind
+                token.value = float(text)
+            else:
+                token.type = kind
+                token.value = text[1:-1]
+            tokens.append(token)
+        skipped = PrattParser.SKIP_REGEX.match(source_code, position).end()
+        lineno += count("\n", position, skipped)
+        if skipped != len(source_code):
+            self.fail()
+        position = skipped
+        end = lex.LexToken()
+        end.type = "$end"
+        end.value = None
+        end.lineno = lineno
+        end.lexpos = position
+        tokens.append(end)
+        return tokens
+
+    def fail(self):
+        raise PrattSyntaxError()
+
+    def peek(self):
+        return self.types[self.position]
+
+    def advance(self):
+        token = self.tokens[self.position]
+        if token.type == "$end":
+            self.fail()
+        self.position += 1
+        return token
+
+    def expect(self, token_type):
+        token = self.tokens[self.position]
+        if token.type != token_type:
+            self.fail()
+        self.position += 1
+        return token
+
+    def reduce(self, rule, *symbols):
+        # runs a PLY rule of OLCScriptParser and gives what it built
+        p = Production(symbols)
+        rule(p)
+        return p[0]
+
+    # ------------------------------------- declarations -------------------------------------
+
+    def parse_declaration(self):
+        token_type = self.peek()
+        if token_type == "INTERFACE":
+            return self.parse_interface()
+        if token_type == "FUNCTION":
+            return self.parse_function()
+        return self.parse_statement()
+
+    def parse_interface(self):
+        interface = self.advance()
+        name = self.expect("IDENTIFIER")
+        lbracer = self.expect("LBRACER")
+        fields = [self.parse_field()]
+        while self.peek() != "RBRACER":
+            fields.append(self.parse_field())
+        rbracer = self.advance()
+        return self.reduce(
+            self.rules.p_interface_declaration_statement,
+            interface,
+            name,
+            lbracer,
+            fields,
+            rbracer,
+        )
 
-    def set_context(self, context=None):
-        self.context = context
-        return self
+    def parse_field(self):
+        name = self.expect("IDENTIFIER")
+        colon = self.expect("COLON")
+        type_ = self.parse_type()
+        semicolon = self.expect("SEMICOLON")
+        return self.reduce(self.rules.p_field, name, colon, type_, semicolon)
+
+    def parse_type(self):
+        name = self.expect("IDENTIFIER")
+        if self.peek() != "LBRACKET":
+            return self.reduce(self.rules.p_lang_types, name)
+        dims = 0
+        while self.peek() == "LBRACKET":
+            self.advance()
+            self.expect("RBRACKET")
+            dims += 1
+        return self.reduce(self.rules.p_lang_types, name, dims)
+
+    def parse_function(self):
+        function = self.advance()
+        name = self.expect("IDENTIFIER")
+        lparen = self.expect("LPAREN")
+        parameters = None
+        if self.peek() != "RPAREN":
+            parameters = [self.parse_parameter()]
+            while self.peek() == "COMMA":
+                self.advance()
+                parameters.append(self.parse_parameter())
+        rparen = self.expect("RPAREN")
+        colon = ret_type = None
+        if self.peek() == "COLON":
+            colon = self.advance()
+            ret_type = self.parse_type()
+        block = self.parse_block()
+        rules = self.rules
+        if parameters is None and colon is None:
+            return self.reduce(
+                rules.p_function_declaration_statement_no_args,
+                function,
+                name,
+                lparen,
+                rparen,
+                block,
+            )
+        if parameters is None:
+            return self.reduce(
+                rules.p_function_declaration_statement_no_args_but_ret_type,
+                function,
+                name,
+                lparen,
+                rparen,
+                colon,
+                ret_type,
+                block,
+            )
+        if colon is None:
+            return self.reduce(
+                rules.p_function_declaration_statement_with_args,
+                function,
+                name,
+                lparen,
+                parameters,
+                rparen,
+                block,
+            )
+        return self.reduce(
+            rules.p_function_declaration_statement_with_args_and_ret_type,
+            function,
+            name,
+            lparen,
+            parameters,
+            rparen,
+            colon,
+            ret_type,
+            block,
+        )
 
-    def set_pos(self, line=None, column=None):
-        self.line = line
-        self.column = column
-        return self
+    def parse_parameter(self):
+        name = self.expect("IDENTIFIER")
+        colon = self.expect("COLON")
+        type_ = self.parse_type()
+        return self.reduce(self.rules.p_function_parameter, name, colon, type_)
+
+    # ------------------------------------- statements -------------------------------------
+
+    def parse_block(self):
+        lbracer = self.expect("LBRACER")
+        if self.peek() == "RBRACER":
+            return self.reduce(self.rules.p_block_empty, lbracer, self.advance())
+        statements = self.parse_statements(("RBRACER",))
+        return self.reduce(self.rules.p_block, lbracer, statements, self.advance())
+
+    def parse_statements(self, terminators):
+        # one statement at least, up to one of the terminators
+        statements = [self.parse_statement()]
+        while self.peek() not in terminators:
+            statements.append(self.parse_statement())
+        return statements
+
+    def parse_statement(self):
+        token_type = self.peek()
+        rules = self.rules
+        if token_type == "IF":
+            return self.parse_if(self.advance())
+        if token_type == "SWITCH":
+            return self.parse_switch()
+        if token_type == "WHILE":
+            while_ = self.advance()
+            lparen = self.expect("LPAREN")
+            condition = self.parse_expression()
+            rparen = self.expect("RPAREN")
+            block = self.parse_block()
+            return self.reduce(
+                rules.p_statement_whlle, while_, lparen, condition, rparen, block
+            )
+        if token_type == "FOR":
+            return self.parse_for()
+        if token_type == "BREAK":
+            return self.reduce(
+                rules.p_statement_break, self.advance(), self.expect("SEMICOLON")
+            )
+        if token_type == "CONTINUE":
+            return self.reduce(
+                rules.p_statement_continue, self.advance(), self.expect("SEMICOLON")
+            )
+        if token_type == "RETURN":
+            return_ = self.advance()
+            if self.peek() == "SEMICOLON":
+                return self.reduce(
+                    rules.p_statement_return_empty, return_, self.advance()
+                )
+            value = self.parse_expression()
+            return self.reduce(
+                rules.p_statement_return_expr,
+                return_,
+                value,
+                self.expect("SEMICOLON"),
+            )
+        if token_type == "VAR" or token_type == "CONST":
+            return self.parse_var_declaration()
+        if token_type == "CONSOLE":
+            console = self.advance()
+            dot = self.expect("DOT")
+            log = self.expect("LOG")
+            lparen = self.expect("LPAREN")
+            arguments = self.parse_arguments()
+            rparen = self.expect("RPAREN")
+            return self.reduce(
+                rules.p_statement_console_log,
+                console,
+                dot,
+                log,
+                lparen,
+                arguments,
+                rparen,
+                self.expect("SEMICOLON"),
+            )
 
-    def copy(self):
-        the_copy = Number(self.value)
-        the_copy.set_context(self.context)
-        the_copy.set_pos(self.line, self.column)
-        return the_copy
+        expression = self.parse_expression()
+        token_type = self.peek()
+        if token_type == "SEMICOLON":
+            self.advance()
+            return expression
+        if token_type == "EQ":
+            rule = rules.p_statement_assign_simple
+        elif token_type in PrattParser.COMPOUND_ASSIGNMENTS:
+            rule = rules.p_statement_assign_compound
+        else:
+            self.fail()
+        operator = self.advance()
+        value = self.parse_expression()
+        return self.reduce(rule, expression, operator, value, self.expect("SEMICOLON"))
+
+    def parse_if(self, if_):
+        # if_ - the IF token, or the ELSE token of an 'else if'
+        rules = self.rules
+        else_if = if_.type == "ELSE"
+        head = [if_]
+        if else_if:
+            head.append(self.expect("IF"))
+        head.append(self.expect("LPAREN"))
+        head.append(self.parse_expression())
+        head.append(self.expect("RPAREN"))
+        head.append(self.parse_block())
+        if self.peek() != "ELSE":
+            rule = (
+                rules.p_statement_elseif_single
+                if else_if
+                else rules.p_statement_if_single
+            )
+            return self.reduce(rule, *head)
+        else_ = self.advance()
+        if self.peek() == "IF":
+            rule = (
+                rules.p_statement_elseif_list
+                if else_if
+                else rules.p_statement_if_elseif
+            )
+            return self.reduce(rule, *head, self.parse_if(else_))
+        rule = rules.p_statement_elseif_else if else_if else rules.p_statement_if_else
+        return self.reduce(rule, *head, else_, self.parse_block())
+
+    def parse_switch(self):
+        rules = self.rules
+        switch = self.advance()
+        lparen = self.expect("LPAREN")
+        value = self.parse_expression()
+        rparen = self.expect("RPAREN")
+        lbracer = self.expect("LBRACER")
+        cases = []
+        terminators = ("CASE", "DEFAULT", "RBRACER")
+        while True:
+            token_type = self.peek()
+            if token_type == "CASE":
+                case = self.advance()
+                case_value = self.parse_expression()
+                colon = self.expect("COLON")
+                if self.peek() in terminators:
+                    cases.append(
+                        self.reduce(
+                            rules.p_statements_cases_empty, case, case_value, colon
+                        )
+                    )
+                else:
+                    statements = self.parse_statements(terminators)
+                    cases.append(
+                        self.reduce(
+                            rules.p_statement_cases, case, case_value, colon, statements
+                        )
+                    )
+            elif token_type == "DEFAULT":
+                default = self.advance()
+                colon = self.expect("COLON")
+                statements = self.parse_statements(terminators)
+                cases.append(
+                    self.reduce(
+                        rules.p_statement_default_case, default, colon, statements
+                    )
+                )
+            elif token_type == "RBRACER" and cases:
+                break
+            else:
+                self.fail()
+        return self.reduce(
+            rules.p_statement_switch_case,
+            switch,
+            lparen,
+            value,
+            rparen,
+            lbracer,
+            cases,
+            self.advance(),
+        )
 
-    def __add__(self, other):
-        return Number(self.value + other.value).set_context(self.context)
+    def parse_for(self):
+        rules = self.rules
+        for_ = self.advance()
+        lparen = self.expect("LPAREN")
+        if self.types[self.position : self.position + 3] in (
+            ["VAR", "IDENTIFIER", "OF"],
+            ["CONST", "IDENTIFIER", "OF"],
+        ):
+            var = self.advance()
+            name = self.advance()
+            of = self.advance()
+            iterable = self.parse_expression()
+            rparen = self.expect("RPAREN")
+            return self.reduce(
+                rules.p_statement_forof_loop,
+                for_,
+                lparen,
+                var,
+                name,
+                of,
+                iterable,
+                rparen,
+                self.parse_block(),
+            )
+        init = [self.parse_for_init()]
+        while self.peek() == "COMMA":
+            self.advance()
+            init.append(self.parse_for_init())
+        first_semicolon = self.expect("SEMICOLON")
+        test = self.parse_expression()
+        second_semicolon = self.expect("SEMICOLON")
+        updates = [self.parse_for_update()]
+        while self.peek() == "COMMA":
+            self.advance()
+            updates.append(self.parse_for_update())
+        rparen = self.expect("RPAREN")
+        return self.reduce(
+            rules.p_statement_for,
+            for_,
+            lparen,
+            init,
+            first_semicolon,
+            test,
+            second_semicolon,
+            updates,
+            rparen,
+            self.parse_block(),
+        )
 
-    def __sub__(self, other):
-        return Number(self.value - other.value).set_context(self.context)
+    def parse_for_init(self):
+        var = self.expect("VAR")
+        name = self.expect("IDENTIFIER")
+        if self.peek() == "COLON":
+            colon = self.advance()
+            type_ = self.parse_type()
+            eq = self.expect("EQ")
+            return self.reduce(
+                self.rules.p_statement_for_init,
+                var,
+                name,
+                colon,
+                type_,
+                eq,
+                self.parse_expression(),
+            )
+        eq = self.expect("EQ")
+        return self.reduce(
+            self.rules.p_statement_for_init_1, var, name, eq, self.parse_expression()
+        )
 
-    def __mul__(self, other):
-        return Number(self.value * other.value).set_context(self.context)
+    def parse_for_update(self):
+        rules = self.rules
+        token_type = self.peek()
+        if token_type == "PPINC" or token_type == "PPDEC":
+            operator = self.advance()
+            rule = (
+                rules.p_statement_for_update_ppinc_prefix
+                if token_type == "PPINC"
+                else rules.p_statement_for_update_ppdec_prefix
+            )
+            return self.reduce(rule, operator, self.parse_expression())
+        target = self.parse_expression()
+        token_type = self.peek()
+        if token_type == "PPINC":
+            rule = rules.p_statement_for_update_ppinc_postfix
+            return self.reduce(rule, target, self.advance())
+        if token_type == "PPDEC":
+            rule = rules.p_statement_for_update_ppdec_posfix
+            return self.reduce(rule, target, self.advance())
+        if token_type == "EQ":
+            rule = rules.p_statement_for_update_normal
+        elif token_type in PrattParser.COMPOUND_ASSIGNMENTS:
+            rule = rules.p_statement_for_update_compound
+        else:
+            self.fail()
+        operator = self.advance()
+        return self.reduce(rule, target, operator, self.parse_expression())
+
+    def parse_var_declaration(self):
+        rules = self.rules
+        keyword = self.advance()
+        is_var = keyword.type == "VAR"
+        name = self.expect("IDENTIFIER")
+        token_type = self.peek()
+        if token_type == "EQ":
+            eq = self.advance()
+            value = self.parse_expression()
+            rule = (
+                rules.p_statement_var_declaration_form_one
+                if is_var
+                else rules.p_statement_var_declaration_form_two
+            )
+            return self.reduce(rule, keyword, name, eq, value, self.expect("SEMICOLON"))
+        if token_type == "SEMICOLON":
+            rule = (
+                rules.p_statement_var_declaration_form_five
+                if is_var
+                else rules.p_statement_var_declaration_form_six
+            )
+            return self.reduce(rule, keyword, name, self.advance())
+        colon = self.expect("COLON")
+        type_ = self.parse_type()
+        if self.peek() == "SEMICOLON":
+            rule = (
+                rules.p_statement_var_declaration_form_eigth
+                if is_var
+                else rules.p_statement_var_declaration_form_seven
+            )
+            return self.reduce(rule, keyword, name, colon, type_, self.advance())
+        eq = self.expect("EQ")
+        value = self.parse_expression()
+        rule = (
+            rules.p_statement_var_declaration_form_three
+            if is_var
+            else rules.p_statement_var_declaration_form_four
+        )
+        return self.reduce(
+            rule, keyword, name, colon, type_, eq, value, self.expect("SEMICOLON")
+        )
+
+    # ------------------------------------- expressions -------------------------------------
+
+    def parse_arguments(self):
+        arguments = [self.parse_expression()]
+        while self.peek() == "COMMA":
+            self.advance()
+            arguments.append(self.parse_expression())
+        return arguments
+
+    def parse_expression(self, min_power=0):
+        # parses the operators that bind tighter than min_power
+        left = self.parse_prefix()
+        binary_operators = PrattParser.BINARY_OPERATORS
+        set_token_column = self.rules.set_token_column
+        last_power = None
+        while True:
+            token_type = self.peek()
+            if token_type == "QMARK":
+                if PrattParser.TERNARY_POWER <= min_power:
+                    return left
+                qmark = self.advance()
+                true_expr = self.parse_expression()
+                colon = self.expect("COLON")
+                # right associative
+                false_expr = self.parse_expression(PrattParser.TERNARY_POWER - 1)
+                left = self.reduce(
+                    self.rules.p_expression_ternary,
+                    left,
+                    qmark,
+                    true_expr,
+                    colon,
+                    false_expr,
+                )
+                last_power = PrattParser.TERNARY_POWER
+                continue
+            binary = binary_operators.get(token_type)
+            if binary is None or binary[0] <= min_power:
+                return left
+            power, node_class = binary
+            if power == last_power and power in PrattParser.NONASSOCIATIVE_POWERS:
+                self.fail()
+            operator = self.advance()
+            right = self.parse_expression(power)
+            set_token_column(operator)
+            left = node_class(left, operator, right)
+            last_power = power
+
+    def parse_prefix(self):
+        token_type = self.peek()
+        if token_type == "BANG" or token_type == "MINUS" or token_type == "TYPEOF":
+            operator = self.advance()
+            operand = self.parse_expression(PrattParser.UNARY_POWER)
+            self.rules.set_token_column(operator)
+            if token_type == "TYPEOF":
+                return TypeOfNode(operator, operand)
+            return UnaryOperationNode(operator, operand)
+        if token_type == "PARSEINT" or token_type == "PARSEFLOAT":
+            builtin = self.advance()
+            lparen = self.expect("LPAREN")
+            value = self.parse_expression()
+            rparen = self.expect("RPAREN")
+            rule = (
+                self.rules.p_expression_parseInt
+                if token_type == "PARSEINT"
+                else self.rules.p_expression_parseFloat
+            )
+            return self.reduce(rule, builtin, lparen, value, rparen)
+        return self.parse_postfix()
+
+    def parse_postfix(self):
+        rules = self.rules
+        node = self.parse_primary()
+        while True:
+            token_type = self.peek()
+            if token_type == "LBRACKET":
+                lbracket = self.advance()
+                index = self.parse_expression()
+                node = self.reduce(
+                    rules.p_postfix_expression_array_access,
+                    node,
+                    lbracket,
+                    index,
+                    self.expect("RBRACKET"),
+                )
+            elif token_type == "DOT":
+                dot = self.advance()
+                node = self.reduce(
+                    rules.p_postfix_expression_member_access_expr,
+                    node,
+                    dot,
+                    self.expect("IDENTIFIER"),
+                )
+            elif token_type == "LPAREN":
+                lparen = self.advance()
+                if self.peek() == "RPAREN":
+                    node = self.reduce(
+                        rules.p_postfix_expression_call_expression_no_args,
+                        node,
+                        lparen,
+                        self.advance(),
+                    )
+                    continue
+                # a call with arguments is not a postfix expression, it ends here
+                arguments = self.parse_arguments()
+                return self.reduce(
+                    rules.p_postfix_expression_call_expression_with_args,
+                    node,
+                    lparen,
+                    arguments,
+                    self.expect("RPAREN"),
+                )
+            else:
+                return node
+
+    def parse_primary(self):
+        token_type = self.peek()
+        node_class = PrattParser.LITERALS.get(token_type)
+        if node_class is not None:
+            token = self.advance()
+            self.rules.set_token_column(token)
+            return node_class(token)
+        rules = self.rules
+        if token_type == "LPAREN":
+            self.advance()
+            expression = self.parse_expression()
+            self.expect("RPAREN")
+            return expression
+        if token_type == "LBRACKET":
+            lbracket = self.advance()
+            if self.peek() == "RBRACKET":
+                return self.reduce(
+                    rules.p_primary_expression_array_empty, lbracket, self.advance()
+                )
+            arguments = self.parse_arguments()
+            return self.reduce(
+                rules.p_primary_expression_array,
+                lbracket,
+                arguments,
+                self.expect("RBRACKET"),
+            )
+        if token_type == "LBRACER":
+            lbracer = self.advance()
+            fields = [self.parse_field_expression()]
+            while self.peek() == "COMMA":
+                self.advance()
+                fields.append(self.parse_field_expression())
+            return self.reduce(
+                rules.p_primary_expression_interface,
+                lbracer,
+                fields,
+                self.expect("RBRACER"),
+            )
+        self.fail()
+
+    def parse_field_expression(self):
+        name = self.expect("IDENTIFIER")
+        colon = self.expect("COLON")
+        return self.reduce(
+            self.rules.p_primary_expression_interface_expression,
+            name,
+            colon,
+            self.parse_expression(),
+        )
+
+
+# ------------------------------------------------------------------------------------
+#                                 VALUES
+# ------------------------------------------------------------------------------------
+
+
+class Number:
+    def __init__(self, value):
+        self.value = value
+        self.type_spec = (
+            Predefined.number_type if isinstance(value, int) else Predefined.float_type
+        )
+        self.set_pos()
+        self.set_context()
+
+    def get_type_spec(self):
+        return self.type_spec
+
+    def set_context(self, context=None):
+        self.context = context
+        return self
+
+    def set_pos(self, line=None, column=None):
+        self.line = line
+        self.column = column
+        return self
+
+    def copy(self):
+        the_copy = Number(self.value)
+        the_copy.set_context(self.context)
+        the_copy.set_pos(self.line, self.column)
+        return the_copy
+
+    def __add__(self, other):
+        return Number(self.value + other.value).set_context(self.context)
+
+    def __sub__(self, other):
+        return Number(self.value - other.value).set_context(self.context)
+
+    def __mul__(self, other):
+        return Number(self.value * other.value).set_context(self.context)
 
     def __truediv__(self, other):
         result = self.value / other.value
@@ -2517,12 +3992,39 @@ class Number:
 
 
 class String:
+    # Concatenations that produce at least this many characters build a rope:
+    # the pieces are appended to a list shared by all the strings built from it,
+    # and the python string is only joined when the value is observed.
+    ROPE_THRESHOLD = 256
+
     def __init__(self, value):
-        self.value = value
+        self._value = value
+        self._chunks = None
+        self._count = 0
+        self._length = len(value) if isinstance(value, str) else 0
         self.type_spec = Predefined.string_type
         self.set_pos()
         self.set_context()
 
+    @staticmethod
+    def from_chunks(chunks, length):
+        string = String("")
+        string._value = None
+        string._chunks = chunks
+        string._count = len(chunks)
+        string._length = length
+        return string
+
+    @property
+    def value(self):
+        # flatten the rope the first time the string is observed
+        if self._value is None:
+            if self._count == len(self._chunks):
+                self._value = "".join(self._chunks)
+            else:
+                self._value = "".join(self._chunks[: self._count])
+        return self._value
+
     def set_context(self, context=None):
         self.context = context
         return self
@@ -2542,7 +4044,19 @@ class String:
         return the_copy
 
     def __add__(self, other):
-        return String(self.value + other.value).set_context(self.context)
+        right = other.value
+        length = self._length + len(right)
+        if length < String.ROPE_THRESHOLD:
+            return String(self.value + right).set_context(self.context)
+
+        # Only the newest string built on a rope may append to it in place,
+        # older strings keep seeing their own prefix of the pieces.
+        if self._chunks is not None and self._count == len(self._chunks):
+            chunks = self._chunks
+        else:
+            chunks = [self.value]
+        chunks.append(right)
+        return String.from_chunks(chunks, length).set_context(self.context)
 
     def __lt__(self, other):
         return (
@@ -2586,16 +4100,22 @@ class String:
             else Boolean(False).set_context(self.context)
         )
 
-    def to_array(self):
-        arr = Array().set_context(self.context).set_pos(self.line, self.column)
-        arr.dims = 1
-        arr.get_type_spec().set_base_type(Predefined.string_type)
-        chars = list(self.value)
-        for ch in chars:
-            arr.push(
-                String(ch).set_context(self.context).set_pos(self.line, self.column)
-            )
-        return arr
+    def length(self):
+        if self._value is None:
+            return self._length
+        return len(self._value)
+
+    def get_item(self, index):
+        return (
+            String(self.value[index])
+            .set_context(self.context)
+            .set_pos(self.line, self.column)
+        )
+
+    def iterate(self):
+        # yields one character at a time, nothing is materialized up front
+        for ch in self.value:
+            yield String(ch).set_context(self.context).set_pos(self.line, self.column)
 
     def __str__(self):
         return f"{self.value}"
@@ -2844,6 +4364,11 @@ class Array:
     def length(self):
         return len(self.elements)
 
+    def iterate(self):
+        # a list iterator pulls one element at a time and sees pushes made
+        # while iterating
+        return iter(self.elements)
+
     def builtin_length(self):
         return Number(len(self.elements))
 
@@ -2880,6 +4405,43 @@ class Array:
         return buffer
 
 
+class Range:
+    def __init__(self, start, stop, step=1):
+        # a python range, the numbers are only boxed while iterating
+        self.value = range(start, stop, step)
+        self.type_spec = Predefined.range_type
+        self.set_pos()
+        self.set_context()
+
+    def set_pos(self, line=None, column=None):
+        self.line = line
+        self.column = column
+        return self
+
+    def set_context(self, context=None):
+        self.context = context
+        return self
+
+    def get_type_spec(self):
+        return self.type_spec
+
+    def copy(self):
+        the_copy = Range(self.value.start, self.value.stop, self.value.step)
+        the_copy.set_context(self.context)
+        the_copy.set_pos(self.line, self.column)
+        return the_copy
+
+    def iterate(self):
+        for number in self.value:
+            yield Number(number)
+
+    def __repr__(self):
+        return f"range({self.value.start}, {self.value.stop}, {self.value.step})"
+
+    def __str__(self):
+        return self.__repr__()
+
+
 class Interface:
     def __init__(self):
         self.fields = InterfaceContext("")
@@ -3054,6 +4616,203 @@ class Symbol:
         return buffer
 
 
+# ------------------------------------------------------------------------------------
+#                                 EXECUTION BUDGET
+# ------------------------------------------------------------------------------------
+
+
+class BudgetExceeded(Exception):
+    # Raised by ExecutionBudget.check, with the error name and the details of
+    # the RTError reported for it
+    pass
+
+
+class ExecutionBudget:
+    # Limits one run of a program: the steps it takes (loop iterations and
+    # calls), the wall clock time and how much the memory of the process grows.
+    # The interpreter and the compiled functions count a step at every loop
+    # iteration and every call, only the step count is checked then, the clock
+    # and the memory are looked at every CHECK_INTERVAL steps. Strings grow much
+    # faster than steps, so the memory is also looked at every
+    # ALLOCATION_INTERVAL characters of strings built. A None limit is not
+    # enforced. Once a limit is exceeded every following step fails too, so the
+    # program stops.
+
+    # the limits of the programs run by /eval, a request can only lower them
+    MAX_STEPS = 50_000_000
+    TIMEOUT_MS = 10_000
+    MAX_MEMORY = 512 * 1024 * 1024
+
+    CHECK_INTERVAL = 1000
+    ALLOCATION_INTERVAL = 16 * 1024 * 1024
+    PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    def __init__(self, max_steps=None, timeout_ms=None, max_memory=None):
+        self.max_steps = max_steps
+        self.timeout_ms = timeout_ms
+        self.max_memory = max_memory
+        self.steps = 0
+        self.next_check = sys.maxsize
+        self.allocated = 0
+        self.next_allocation_check = sys.maxsize
+        self.deadline = None
+        self.memory_limit = None
+        self.exceeded = None
+
+    @staticmethod
+    def for_request(request_dict, max_steps=None, timeout_ms=None):
+        # the limits of /eval, or the higher ones given, lowered by the request
+        limits = []
+        for name, default in (
+            ("max_steps", max_steps or ExecutionBudget.MAX_STEPS),
+            ("timeout_ms", timeout_ms or ExecutionBudget.TIMEOUT_MS),
+            ("max_memory", ExecutionBudget.MAX_MEMORY),
+        ):
+            value = request_dict.get(name)
+            if (
+                type(value) is int
+                and value > 0
+                and (default is None or value < default)
+            ):
+                default = value
+            limits.append(default)
+        return ExecutionBudget(*limits)
+
+    @staticmethod
+    def memory_in_use():
+        # the resident size of the process, None where it can not be read
+        try:
+            with open("/proc/self/statm") as statm:
+                return int(statm.read().split()[1]) * ExecutionBudget.PAGE_SIZE
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def start(self):
+        self.steps = 0
+        self.allocated = 0
+        self.exceeded = None
+        if self.timeout_ms is not None:
+            self.deadline = time.perf_counter() + self.timeout_ms / 1000
+        if self.max_memory is not None:
+            memory = ExecutionBudget.memory_in_use()
+            if memory is not None:
+                self.memory_limit = memory + self.max_memory
+                self.next_allocation_check = ExecutionBudget.ALLOCATION_INTERVAL
+        self.schedule()
+
+    def allocate(self, size):
+        # counts the characters of a string built
+        self.allocated += size
+        if self.allocated >= self.next_allocation_check:
+            self.next_allocation_check = (
+                self.allocated + ExecutionBudget.ALLOCATION_INTERVAL
+            )
+            self.check()
+
+    def schedule(self):
+        if self.deadline is None and self.memory_limit is None:
+            next_check = sys.maxsize
+        else:
+            next_check = self.steps + ExecutionBudget.CHECK_INTERVAL
+        if self.max_steps is not None:
+            next_check = min(next_check, self.max_steps + 1)
+        self.next_check = next_check
+
+    def check(self):
+        # called once steps reaches next_check
+        if self.exceeded is None:
+            if self.max_steps is not None and self.steps > self.max_steps:
+                self.exceeded = (
+                    "OLC9001",
+                    f"execution stopped after {self.max_steps} steps (loop iterations and calls)",
+                )
+            elif self.deadline is not None and time.perf_counter() > self.deadline:
+                self.exceeded = (
+                    "OLC9002",
+                    f"execution took longer than {self.timeout_ms} ms",
+                )
+            elif (
+                self.memory_limit is not None
+                and (ExecutionBudget.memory_in_use() or 0) > self.memory_limit
+            ):
+                self.exceeded = (
+                    "OLC9003",
+                    f"execution used more than {self.max_memory // (1024 * 1024)} MB of memory",
+                )
+        if self.exceeded is not None:
+            self.next_check = 0
+            raise BudgetExceeded(*self.exceeded)
+        self.schedule()
+
+    def cancel(self, details):
+        # stops the program at its next step, from any thread
+        if self.exceeded is None:
+            self.exceeded = ("OLC9004", details)
+        self.next_check = 0
+
+
+# ------------------------------------------------------------------------------------
+#                                 CONSOLE LOG
+# ------------------------------------------------------------------------------------
+
+
+class ConsoleLog:
+    # The console lines of a run, up to max_size characters of them: the first
+    # lines, up to half of it, and the most recent ones, which hold the errors
+    # that stopped the program. The lines in between are dropped as the program
+    # prints and a line in their place tells how much is missing. A line longer
+    # than the room left keeps only its start.
+
+    MAX_SIZE = 1024 * 1024
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size or ConsoleLog.MAX_SIZE
+        self.head = []
+        self.head_size = 0
+        self.tail = collections.deque()
+        self.tail_size = 0
+        self.dropped_lines = 0
+        self.dropped_size = 0
+
+    def append(self, line):
+        size = len(line) + 1
+        if not self.tail and self.head_size + size <= self.max_size // 2:
+            self.head.append(line)
+            self.head_size += size
+            return
+        room = self.max_size - self.head_size
+        if size > room:
+            self.dropped_size += size - room
+            line = line[: room - 1]
+            size = room
+        self.tail.append(line)
+        self.tail_size += size
+        while self.tail_size > room:
+            dropped = self.tail.popleft()
+            self.tail_size -= len(dropped) + 1
+            self.dropped_lines += 1
+            self.dropped_size += len(dropped) + 1
+
+    def is_truncated(self):
+        return self.dropped_size > 0
+
+    def __len__(self):
+        return len(self.head) + len(self.tail)
+
+    def __iter__(self):
+        yield from self.head
+        yield from self.tail
+
+    def as_string(self):
+        if not self.is_truncated():
+            return "\n".join(self)
+        marker = (
+            f"... output truncated, {self.dropped_lines} lines and "
+            f"{self.dropped_size} characters left out ..."
+        )
+        return "\n".join([*self.head, marker, *self.tail])
+
+
 # ------------------------------------------------------------------------------------
 #                                 INTERPRETER
 # ------------------------------------------------------------------------------------
@@ -3061,70 +4820,134 @@ class Symbol:
 
 class Interpreter:
 
-    def __init__(self, source_code, global_context, file=None):
+    # functions called this many times are compiled to python, 0 disables it
+    COMPILE_THRESHOLD = 50
+
+    # Math.pow() of two numbers is exact up to this many bits, above it the
+    # result is a float like in javascript. Python takes long to build huge
+    # ints and refuses to print those of more than 4300 digits.
+    MAX_EXACT_POWER_BITS = 14_000
+
+    # Math builtins: name -> (min number of arguments, max number of arguments)
+    # a None maximum means the function is variadic.
+    MATH_FUNCTIONS = {
+        "sqrt": (1, 1),
+        "pow": (2, 2),
+        "floor": (1, 1),
+        "abs": (1, 1),
+        "min": (1, None),
+        "max": (1, None),
+        "random": (0, 0),
+        "seed": (1, 1),
+    }
+
+    # the result types are shared by every interpreter, like the types in them
+    ASSIGN_RESULT_TYPE = {
+        (TypeForm.NUMBER, TypeForm.NUMBER): True,
+        (TypeForm.FLOAT, TypeForm.FLOAT): True,
+        (TypeForm.STRING, TypeForm.STRING): True,
+        (TypeForm.BOOLEAN, TypeForm.BOOLEAN): True,
+        (TypeForm.CHAR, TypeForm.CHAR): True,
+        (TypeForm.ARRAY, TypeForm.ARRAY): True,
+        (TypeForm.MATRIX, TypeForm.MATRIX): True,
+        (TypeForm.FLOAT, TypeForm.NUMBER): True,
+        (TypeForm.NUMBER, TypeForm.FLOAT): True,
+        (TypeForm.ARRAY, TypeForm.NULL): True,
+        (TypeForm.MATRIX, TypeForm.NULL): True,
+        (TypeForm.INTERFACE, TypeForm.INTERFACE): True,
+        (TypeForm.RANGE, TypeForm.RANGE): True,
+    }
+
+    ARITH_RESULT_TYPE = {
+        (Predefined.number_type, Predefined.number_type): Predefined.number_type,
+        (Predefined.float_type, Predefined.float_type): Predefined.float_type,
+        (Predefined.number_type, Predefined.float_type): Predefined.float_type,
+        (Predefined.string_type, Predefined.string_type): Predefined.string_type,
+        (Predefined.float_type, Predefined.number_type): Predefined.float_type,
+    }
+    # specialized arithmetic nodes by operand types, see arithmetic_operation()
+    QUICKENED_ARITHMETIC = {
+        (
+            Predefined.number_type,
+            Predefined.number_type,
+        ): IntArithmeticOperationNode,
+        (
+            Predefined.float_type,
+            Predefined.float_type,
+        ): FloatArithmeticOperationNode,
+        (
+            Predefined.string_type,
+            Predefined.string_type,
+        ): StringConcatOperationNode,
+    }
+    PROMOTE_FROM_TO = {
+        (Predefined.number_type, Predefined.float_type): Predefined.float_type,
+        (Predefined.float_type, Predefined.number_type): Predefined.float_type,
+    }
+    RELATIONAL_RESULT_TYPE = {
+        (Predefined.number_type, Predefined.number_type): Predefined.boolean_type,
+        (Predefined.number_type, Predefined.float_type): Predefined.boolean_type,
+        (Predefined.float_type, Predefined.float_type): Predefined.boolean_type,
+        (Predefined.float_type, Predefined.number_type): Predefined.boolean_type,
+        (Predefined.string_type, Predefined.string_type): Predefined.boolean_type,
+        (Predefined.char_type, Predefined.char_type): Predefined.boolean_type,
+    }
+    LOGICAL_RESULT_TYPE = {
+        (Predefined.boolean_type, Predefined.boolean_type): Predefined.boolean_type,
+    }
+    EQUALITY_RESULT_TYPE = {
+        (Predefined.number_type, Predefined.number_type): Predefined.boolean_type,
+        (Predefined.number_type, Predefined.float_type): Predefined.boolean_type,
+        (Predefined.float_type, Predefined.float_type): Predefined.boolean_type,
+        (Predefined.float_type, Predefined.number_type): Predefined.boolean_type,
+        (Predefined.boolean_type, Predefined.boolean_type): Predefined.boolean_type,
+        (Predefined.string_type, Predefined.string_type): Predefined.boolean_type,
+        (Predefined.char_type, Predefined.char_type): Predefined.boolean_type,
+    }
+
+    def __init__(
+        self,
+        source_code,
+        global_context,
+        file=None,
+        random_seed=None,
+        budget=None,
+        output=None,
+        echo=None,
+        max_output=None,
+    ):
 
         self.global_context = global_context
         self.source_code = source_code
         self.source_code_listing = self.make_source_code_listing()
         self.array_dimensions = []
         self.file = file or "<stdin>"
-        self.init_result_types_map()
-        self.init_assign_result_types_map()
-        self.log = []
+        self.log = ConsoleLog(max_output)
         self.errors = []
         self.errors_as_string = ""
         self.log_as_string = ""
         self.symbols = {}
         self.symbols_as_string = ""
-
-    def init_assign_result_types_map(self):
-        self.ASSIGN_RESULT_TYPE = {
-            (TypeForm.NUMBER, TypeForm.NUMBER): True,
-            (TypeForm.FLOAT, TypeForm.FLOAT): True,
-            (TypeForm.STRING, TypeForm.STRING): True,
-            (TypeForm.BOOLEAN, TypeForm.BOOLEAN): True,
-            (TypeForm.CHAR, TypeForm.CHAR): True,
-            (TypeForm.ARRAY, TypeForm.ARRAY): True,
-            (TypeForm.MATRIX, TypeForm.MATRIX): True,
-            (TypeForm.FLOAT, TypeForm.NUMBER): True,
-            (TypeForm.NUMBER, TypeForm.FLOAT): True,
-            (TypeForm.ARRAY, TypeForm.NULL): True,
-            (TypeForm.MATRIX, TypeForm.NULL): True,
-            (TypeForm.INTERFACE, TypeForm.INTERFACE): True,
-        }
-
-    def init_result_types_map(self):
-        self.ARITH_RESULT_TYPE = {
-            (Predefined.number_type, Predefined.number_type): Predefined.number_type,
-            (Predefined.float_type, Predefined.float_type): Predefined.float_type,
-            (Predefined.number_type, Predefined.float_type): Predefined.float_type,
-            (Predefined.string_type, Predefined.string_type): Predefined.string_type,
-            (Predefined.float_type, Predefined.number_type): Predefined.float_type,
-        }
-        self.PROMOTE_FROM_TO = {
-            (Predefined.number_type, Predefined.float_type): Predefined.float_type,
-            (Predefined.float_type, Predefined.number_type): Predefined.float_type,
-        }
-        self.RELATIONAL_RESULT_TYPE = {
-            (Predefined.number_type, Predefined.number_type): Predefined.boolean_type,
-            (Predefined.number_type, Predefined.float_type): Predefined.boolean_type,
-            (Predefined.float_type, Predefined.float_type): Predefined.boolean_type,
-            (Predefined.float_type, Predefined.number_type): Predefined.boolean_type,
-            (Predefined.string_type, Predefined.string_type): Predefined.boolean_type,
-            (Predefined.char_type, Predefined.char_type): Predefined.boolean_type,
-        }
-        self.LOGICAL_RESULT_TYPE = {
-            (Predefined.boolean_type, Predefined.boolean_type): Predefined.boolean_type,
-        }
-        self.EQUALITY_RESULT_TYPE = {
-            (Predefined.number_type, Predefined.number_type): Predefined.boolean_type,
-            (Predefined.number_type, Predefined.float_type): Predefined.boolean_type,
-            (Predefined.float_type, Predefined.float_type): Predefined.boolean_type,
-            (Predefined.float_type, Predefined.number_type): Predefined.boolean_type,
-            (Predefined.boolean_type, Predefined.boolean_type): Predefined.boolean_type,
-            (Predefined.string_type, Predefined.string_type): Predefined.boolean_type,
-            (Predefined.char_type, Predefined.char_type): Predefined.boolean_type,
-        }
+        # Math.random() generator, a seed makes runs reproducible
+        self.random = random.Random(random_seed)
+        # whether the program drew numbers from a generator it was not given a
+        # seed for, then the run can not be repeated
+        self.is_seeded = random_seed is not None
+        self.used_random = False
+        # values of loop invariant expressions, by optimizer slot
+        self.hoisted_values = {}
+        # the arguments of the inlined calls being evaluated
+        self.inlined_arguments = []
+        # calls made to every function, and the function compiled once it got hot
+        self.call_counts = {}
+        self.compiled_functions = {}
+        # the limits of this run, none by default
+        self.budget = budget or ExecutionBudget()
+        # called with every console line instead of keeping it in the log
+        self.output = output
+        # a LogSink the console lines are sent to as well, for the command line
+        # and the repl
+        self.echo = echo
 
     def visit(self, node, context):
         method_name = f"visit_{type(node).__name__}"
@@ -3177,13 +5000,7 @@ class Interpreter:
         return result
 
     def make_source_code_listing(self):
-        listing = {}
-        lines = self.source_code.split("\n")
-        counter = 1
-        for line in lines:
-            listing[counter] = line
-            counter += 1
-        return listing
+        return SourceLines.for_source(self.source_code)
 
     def get_name_of_type(self, value):
         if isinstance(value, tuple):
@@ -3205,6 +5022,8 @@ class Interpreter:
             return f"null"
         elif value_type_form == TypeForm.UNDEFINED:
             return f"undefined"
+        elif value_type_form == TypeForm.RANGE:
+            return f"range"
         elif value_type_form == TypeForm.ARRAY or value_type_form == TypeForm.MATRIX:
             if isinstance(value, tuple):
                 base_type_name = (
@@ -3243,6 +5062,11 @@ class Interpreter:
         if res.should_return():
             return res
 
+        return self.arithmetic_operation(node, left, right, context)
+
+    def arithmetic_operation(self, node, left, right, context):
+        res = RTResult()
+
         # Are both types compatible ?
         lhs_type = left.get_type_spec()
         rhs_type = right.get_type_spec()
@@ -3275,6 +5099,10 @@ class Interpreter:
 
         if node.operator.type == "PLUS":
             result = left + right
+            if is_string:
+                error = self.allocate(node, context, result)
+                if error:
+                    return res.failure(error)
         elif node.operator.type == "MINUS":
             if is_string:
                 return res.failure(
@@ -3361,6 +5189,100 @@ class Interpreter:
                     )
                 )
 
+        # the next time the node runs it expects the same operand types
+        if type(node) is ArithmeticOperationNode and not node.is_polymorphic:
+            quickened_class = self.QUICKENED_ARITHMETIC.get((lhs_type, rhs_type))
+            if quickened_class is not None:
+                node.__class__ = quickened_class
+
+        return res.success(result.set_pos(node.line, node.column))
+
+    def despecialize(self, node, generic_class):
+        # the operand types changed, the node goes back to the generic visit for good
+        node.__class__ = generic_class
+        node.is_polymorphic = True
+
+    def visit_IntArithmeticOperationNode(self, node, context):
+        res = RTResult()
+
+        left = res.register(self.visit(node.left, context))
+        if res.should_return():
+            return res
+        right = res.register(self.visit(node.right, context))
+        if res.should_return():
+            return res
+
+        if (
+            left.type_spec is not Predefined.number_type
+            or right.type_spec is not Predefined.number_type
+        ):
+            self.despecialize(node, ArithmeticOperationNode)
+            return self.arithmetic_operation(node, left, right, context)
+
+        return self.number_arithmetic_operation(node, left, right, context)
+
+    def visit_FloatArithmeticOperationNode(self, node, context):
+        res = RTResult()
+
+        left = res.register(self.visit(node.left, context))
+        if res.should_return():
+            return res
+        right = res.register(self.visit(node.right, context))
+        if res.should_return():
+            return res
+
+        if (
+            left.type_spec is not Predefined.float_type
+            or right.type_spec is not Predefined.float_type
+        ):
+            self.despecialize(node, ArithmeticOperationNode)
+            return self.arithmetic_operation(node, left, right, context)
+
+        return self.number_arithmetic_operation(node, left, right, context)
+
+    def number_arithmetic_operation(self, node, left, right, context):
+        # both operands have the same number type, no type checks or promotions
+        operator = node.operator.type
+        if operator == "PLUS":
+            result = left + right
+        elif operator == "MINUS":
+            result = left - right
+        elif operator == "TIMES":
+            result = left * right
+        elif right.value == 0:
+            # division by zero is reported as usual
+            return self.arithmetic_operation(node, left, right, context)
+        elif operator == "DIVIDE":
+            result = left / right
+        elif right.type_spec is Predefined.float_type:
+            # so is the modulo between floats
+            return self.arithmetic_operation(node, left, right, context)
+        else:
+            result = left % right
+
+        return RTResult().success(result.set_pos(node.line, node.column))
+
+    def visit_StringConcatOperationNode(self, node, context):
+        res = RTResult()
+
+        left = res.register(self.visit(node.left, context))
+        if res.should_return():
+            return res
+        right = res.register(self.visit(node.right, context))
+        if res.should_return():
+            return res
+
+        if (
+            left.type_spec is not Predefined.string_type
+            or right.type_spec is not Predefined.string_type
+        ):
+            self.despecialize(node, ArithmeticOperationNode)
+            return self.arithmetic_operation(node, left, right, context)
+
+        result = left + right
+        error = self.allocate(node, context, result)
+        if error:
+            return res.failure(error)
         return res.success(result.set_pos(node.line, node.column))
 
     #######################################################################################
@@ -3376,6 +5298,11 @@ class Interpreter:
         if res.should_return():
             return res
 
+        return self.relational_operation(node, lhs, rhs, context)
+
+    def relational_operation(self, node, lhs, rhs, context):
+        res = RTResult()
+
         # Are both types compatibles?
         lhs_type = lhs.get_type_spec()
         rhs_type = rhs.get_type_spec()
@@ -3416,6 +5343,47 @@ class Interpreter:
         else:
             result = lhs >= rhs
 
+        # the next time the node runs it expects the same operand types
+        if (
+            type(node) is RelationalOperationNode
+            and not node.is_polymorphic
+            and lhs_type is rhs_type
+            and (
+                lhs_type is Predefined.number_type or lhs_type is Predefined.float_type
+            )
+        ):
+            node.__class__ = NumberRelationalOperationNode
+
+        return res.success(result.set_pos(node.line, node.column))
+
+    def visit_NumberRelationalOperationNode(self, node, context):
+        res = RTResult()
+
+        lhs = res.register(self.visit(node.left, context))
+        if res.should_return():
+            return res
+        rhs = res.register(self.visit(node.right, context))
+        if res.should_return():
+            return res
+
+        # both numbers or both floats, no promotion needed
+        if lhs.type_spec is not rhs.type_spec or (
+            lhs.type_spec is not Predefined.number_type
+            and lhs.type_spec is not Predefined.float_type
+        ):
+            self.despecialize(node, RelationalOperationNode)
+            return self.relational_operation(node, lhs, rhs, context)
+
+        operator = node.operator.type
+        if operator == "LT":
+            result = lhs < rhs
+        elif operator == "LTE":
+            result = lhs <= rhs
+        elif operator == "GT":
+            result = lhs > rhs
+        else:
+            result = lhs >= rhs
+
         return res.success(result.set_pos(node.line, node.column))
 
     #######################################################################################
@@ -3535,6 +5503,11 @@ class Interpreter:
             Null().set_context(context).set_pos(node.line, node.column)
         )
 
+    def visit_ConstantNode(self, node, context):
+        return RTResult().success(
+            node.value.copy().set_context(context).set_pos(node.line, node.column)
+        )
+
     #######################################################################################
 
     def visit_CharLiteralNode(self, node, context):
@@ -3728,6 +5701,7 @@ class Interpreter:
                 or target_type_form == TypeForm.STRING
                 or target_type_form == TypeForm.NULL
                 or target_type_form == TypeForm.UNDEFINED
+                or target_type_form == TypeForm.RANGE
             ):
                 target_type_name = target_type_form.name.lower()
             if (
@@ -3738,6 +5712,7 @@ class Interpreter:
                 or source_type_form == TypeForm.STRING
                 or source_type_form == TypeForm.NULL
                 or source_type_form == TypeForm.UNDEFINED
+                or source_type_form == TypeForm.RANGE
             ):
                 source_type_name = source_type_form.name.lower()
             tdims = "[]" * target_dimensions
@@ -3875,6 +5850,7 @@ class Interpreter:
                 or target_type_form == TypeForm.STRING
                 or target_type_form == TypeForm.NULL
                 or target_type_form == TypeForm.UNDEFINED
+                or target_type_form == TypeForm.RANGE
             ):
                 target_type_name = target_type_form.name.lower()
             if (
@@ -3885,6 +5861,7 @@ class Interpreter:
                 or source_type_form == TypeForm.STRING
                 or source_type_form == TypeForm.NULL
                 or source_type_form == TypeForm.UNDEFINED
+                or source_type_form == TypeForm.RANGE
             ):
                 source_type_name = source_type_form.name.lower()
             tdims = "[]" * target_dimensions
@@ -4094,12 +6071,29 @@ class Interpreter:
 
     #######################################################################################
 
-    def visit_IdentifierNode(self, node, context):
-        res = RTResult()
-        var_name = node.token.value
-        value = context.lookup(var_name)
+    def visit_DeclarationSymbolNode(self, node, context):
+        # The declaration was removed by the optimizer, only the symbol is reported
+        self.symbols[(node.name, node.token.lineno, node.token.lexpos)] = Symbol(
+            node.name,
+            "constant" if node.is_constant else "variable",
+            node.type_name,
+            context.display_name,
+            node.token.lineno,
+            node.token.lexpos,
+        )
 
-        if value is None:
+        return RTResult().success(
+            Undefined().set_context(context).set_pos(node.line, node.column)
+        )
+
+    #######################################################################################
+
+    def visit_IdentifierNode(self, node, context):
+        res = RTResult()
+        var_name = node.token.value
+        value = context.lookup(var_name)
+
+        if value is None:
             return res.failure(
                 RTError(
                     self.source_code_listing.get(node.line),
@@ -4129,18 +6123,21 @@ class Interpreter:
         res = RTResult()
         last_evaluated = None
 
+        self.budget.start()
         for statement in node.statements:
             last_evaluated = res.register(self.visit(statement, context))
             if res.error:
                 self.errors.append(res.error.as_string())
-                self.log.append(res.error.as_string())
-                print(res.error.as_string())
+                self.write_line(res.error.as_string())
+                # the program ran out of budget, nothing else can run
+                if self.budget.exceeded is not None:
+                    break
 
         # Create the report for errors and logs
         self.errors_as_string = "\n".join([err for err in self.errors])
 
         # Create the log for console
-        self.log_as_string = "\n".join([line for line in self.log])
+        self.log_as_string = self.log.as_string()
 
         # Create the symbol table report
         self.symbols_as_string = "\n".join(
@@ -4160,14 +6157,21 @@ class Interpreter:
                 return res
             results.append(result.__str__())
 
-        line = " ".join(results)
-        self.log.append(line)
-        print(line)
+        self.write_line(" ".join(results))
 
         return res.success(
             Undefined().set_context(context).set_pos(node.line, node.column)
         )
 
+    def write_line(self, line):
+        # a line of the console, kept for log_as_string or sent to the output
+        if self.output is None:
+            self.log.append(line)
+        else:
+            self.output(line)
+        if self.echo is not None:
+            self.echo.console(line)
+
     #######################################################################################
 
     def visit_BreakNode(self, node, context):
@@ -4322,6 +6326,8 @@ class Interpreter:
 
         # Evaluate the expression for the assignment
         value = res.register(self.visit(node.rvalue, context))
+        if res.should_return():
+            return res
 
         # Get the type spec for the entry
         entry_type_spec = entry.get_type_spec()
@@ -4342,6 +6348,27 @@ class Interpreter:
 
     #######################################################################################
 
+    def visit_HoistingLoopNode(self, node, context):
+        # the invariants are computed again every time the loop starts
+        for slot in node.slots:
+            self.hoisted_values.pop(slot, None)
+        return self.visit(node.loop, context)
+
+    #######################################################################################
+
+    def visit_HoistedNode(self, node, context):
+        value = self.hoisted_values.get(node.slot)
+        if value is not None:
+            return RTResult().success(value)
+
+        # first use in this run of the loop, errors are reported right here
+        res = self.visit(node.expr_node, context)
+        if not res.error:
+            self.hoisted_values[node.slot] = res.value
+        return res
+
+    #######################################################################################
+
     def visit_WhileNode(self, node, context):
         res = RTResult()
         # The body of the while node
@@ -4368,6 +6395,9 @@ class Interpreter:
                 )
             if condition.value is not True or should_break:
                 break
+            error = self.spend(node, context)
+            if error:
+                return res.failure(error)
             while_context = WhileContext("while", context, node.line)
             for stmt in stmts:
                 value = res.register(self.visit(stmt, while_context))
@@ -4649,10 +6679,11 @@ class Interpreter:
         if res.should_return():
             return res
 
-        # is the left hand side a valid array expression ?
+        # is the left hand side a valid array (or string) expression ?
         if (
             not left.get_type_spec().form == TypeForm.ARRAY
             and not left.get_type_spec().form == TypeForm.MATRIX
+            and not left.get_type_spec().form == TypeForm.STRING
         ):
             return res.failure(
                 RTError(
@@ -4677,8 +6708,8 @@ class Interpreter:
         if res.should_return():
             return res
 
-        # right must be of type number
-        if not isinstance(right, Number):
+        # right must be of type number, and an integer
+        if not isinstance(right, Number) or not isinstance(right.value, int):
             return res.failure(
                 RTError(
                     self.source_code_listing.get(node.line),
@@ -4699,7 +6730,11 @@ class Interpreter:
                     node.line,
                     node.column,
                     "IndexError",
-                    f"Array index out of bounds.",
+                    (
+                        f"String index out of bounds."
+                        if isinstance(left, String)
+                        else f"Array index out of bounds."
+                    ),
                     context,
                     self.file,
                 )
@@ -4886,6 +6921,204 @@ class Interpreter:
 
     #######################################################################################
 
+    def visit_BuiltinMath(self, node, context):
+        # token - the token '('
+        # function_name - the name of the Math function (a string)
+        # arguments - a list of expressions
+        res = RTResult()
+
+        arity = self.MATH_FUNCTIONS.get(node.function_name, None)
+        if arity is None:
+            return res.failure(
+                RTError(
+                    self.source_code_listing.get(node.line),
+                    node.line,
+                    node.column,
+                    "TypeError",
+                    f"'{node.function_name}' is not a function of 'Math'",
+                    context,
+                    self.file,
+                )
+            )
+
+        # check the number of arguments
+        min_args, max_args = arity
+        if len(node.arguments) < min_args or (
+            max_args is not None and len(node.arguments) > max_args
+        ):
+            expected = min_args if min_args == max_args else f"at least {min_args}"
+            return res.failure(
+                RTError(
+                    self.source_code_listing.get(node.line),
+                    node.line,
+                    node.column,
+                    "OLC8812",
+                    f"to many or to few arguments, got: {len(node.arguments)}, expect: {expected}",
+                    context,
+                    self.file,
+                )
+            )
+
+        # eval the arguments, every argument must be of type number or float
+        args = []
+        for argument in node.arguments:
+            value = res.register(self.visit(argument, context))
+            if res.should_return():
+                return res
+            if not isinstance(value, Number):
+                return res.failure(
+                    RTError(
+                        self.source_code_listing.get(argument.line),
+                        node.line,
+                        node.column,
+                        "TypeError",
+                        f"Math.{node.function_name}() argument must be 'number' or 'float', got '{self.get_name_of_type(value)}'",
+                        context,
+                        self.file,
+                    )
+                )
+            args.append(value)
+
+        try:
+            result = self.call_math_function(node.function_name, args)
+        except OverflowError:
+            return res.failure(
+                RTError(
+                    self.source_code_listing.get(node.line),
+                    node.line,
+                    node.column,
+                    "OLC1011",
+                    f"the result of Math.{node.function_name}() is too large",
+                    context,
+                    self.file,
+                )
+            )
+        except ValueError:
+            return res.failure(
+                RTError(
+                    self.source_code_listing.get(node.line),
+                    node.line,
+                    node.column,
+                    "OLC1011",
+                    f"math domain error in Math.{node.function_name}()",
+                    context,
+                    self.file,
+                )
+            )
+        if node.function_name == "pow" and isinstance(result.value, int):
+            # exact powers are charged like strings of as many bytes
+            try:
+                self.budget.allocate(result.value.bit_length() // 8)
+            except BudgetExceeded as exceeded:
+                return res.failure(self.budget_error(node, context, exceeded))
+
+        return res.success(result.set_context(context).set_pos(node.line, node.column))
+
+    def call_math_function(self, name, args):
+        # args - a list of Number values, already checked
+        # number arguments keep the number type whenever the result is exact
+        if name == "sqrt":
+            value = args[0].value
+            if (
+                isinstance(value, int)
+                and value >= 0
+                and math.isqrt(value) ** 2 == value
+            ):
+                return Number(math.isqrt(value))
+            return Number(math.sqrt(value))
+        elif name == "pow":
+            base, exponent = args[0].value, args[1].value
+            if (
+                isinstance(base, int)
+                and isinstance(exponent, int)
+                and exponent >= 0
+                and (
+                    abs(base) <= 1
+                    or abs(base).bit_length() * exponent
+                    <= Interpreter.MAX_EXACT_POWER_BITS
+                )
+            ):
+                return Number(base**exponent)
+            # raises OverflowError past the largest float
+            return Number(math.pow(base, exponent))
+        elif name == "floor":
+            return Number(math.floor(args[0].value))
+        elif name == "abs":
+            return Number(abs(args[0].value))
+        elif name == "min":
+            return min(args, key=lambda arg: arg.value).copy()
+        elif name == "max":
+            return max(args, key=lambda arg: arg.value).copy()
+        elif name == "random":
+            if not self.is_seeded:
+                self.used_random = True
+            return Number(self.random.random())
+        else:  # the only function left is Math.seed()
+            self.random.seed(args[0].value)
+            self.is_seeded = True
+            return Undefined()
+
+    #######################################################################################
+
+    def call_builtin_range(self, node, context):
+        # range() when the program has no function of that name, node is the
+        # CallExprNode, arguments - one to three expressions: [start,] stop [, step]
+        res = RTResult()
+
+        if len(node.arguments) < 1 or len(node.arguments) > 3:
+            return res.failure(
+                RTError(
+                    self.source_code_listing.get(node.line),
+                    node.line,
+                    node.column,
+                    "OLC8812",
+                    f"to many or to few arguments, got: {len(node.arguments)}, expect: 1 to 3",
+                    context,
+                    self.file,
+                )
+            )
+
+        # every bound must be of type number
+        bounds = []
+        for argument in node.arguments:
+            value = res.register(self.visit(argument, context))
+            if res.should_return():
+                return res
+            if value.get_type_spec().get_form() != TypeForm.NUMBER:
+                return res.failure(
+                    RTError(
+                        self.source_code_listing.get(argument.line),
+                        node.line,
+                        node.column,
+                        "TypeError",
+                        f"range() argument must be 'number', got '{self.get_name_of_type(value)}'",
+                        context,
+                        self.file,
+                    )
+                )
+            bounds.append(value.value)
+
+        if len(bounds) == 1:
+            bounds.insert(0, 0)
+        if len(bounds) == 3 and bounds[2] == 0:
+            return res.failure(
+                RTError(
+                    self.source_code_listing.get(node.line),
+                    node.line,
+                    node.column,
+                    "OLC8813",
+                    f"range() step must not be zero",
+                    context,
+                    self.file,
+                )
+            )
+
+        return res.success(
+            Range(*bounds).set_context(context).set_pos(node.line, node.column)
+        )
+
+    #######################################################################################
+
     def visit_FunctionNode(self, node, context):
         # node structure
         # token - The token 'function'
@@ -5017,6 +7250,9 @@ class Interpreter:
         fn = self.global_context.lookup_function(node.caller.token.value)
         # if the function is not defined
         if not fn:
+            # a function of the program named range shadows the builtin
+            if node.caller.token.value == "range":
+                return self.call_builtin_range(node, context)
             return res.failure(
                 RTError(
                     self.source_code_listing.get(node.line),
@@ -5069,6 +7305,27 @@ class Interpreter:
             if res.should_return():
                 return res
 
+        error = self.spend(node, context)
+        if error:
+            return res.failure(error)
+
+        # A hot function runs compiled, unless it gives up on this call
+        compiled = self.compiled_function(fn)
+        if compiled is not None:
+            try:
+                value = compiled(*[arg.value for arg in args])
+            except BudgetExceeded as exceeded:
+                return res.failure(self.budget_error(node, context, exceeded))
+            except Exception:
+                pass
+            else:
+                return_value = (
+                    Boolean(value) if isinstance(value, bool) else Number(value)
+                )
+                return res.success(
+                    return_value.set_context(context).set_pos(node.line, node.column)
+                )
+
         # A context to execute the function
         function_context = FunctionContext(fn.name.token.value, context, node.line)
 
@@ -5144,6 +7401,95 @@ class Interpreter:
 
     #######################################################################################
 
+    def visit_InlinedCallNode(self, node, context):
+        # The body is evaluated in the caller context, like a function body
+        # looks up every name that is not a parameter. Whenever something is
+        # not as the optimizer expected, the original call runs instead, so
+        # type promotions and errors (with the function frame in the
+        # traceback) are handled by visit_CallExprNode.
+        res = RTResult()
+
+        error = self.spend(node, context)
+        if error:
+            return res.failure(error)
+
+        # the function may not be defined yet
+        fn = self.global_context.lookup_function(node.name)
+        if fn is None or fn.token is not node.function_token:
+            return self.visit(node.call, context)
+
+        args = []
+        for index, arg in enumerate(node.arguments):
+            value = res.register(self.visit(arg, context))
+            if res.should_return():
+                return res
+            if value.get_type_spec().get_form() != node.parameter_forms[index]:
+                return self.visit(node.call, context)
+            args.append(value)
+
+        self.inlined_arguments.append(args)
+        body_res = self.visit(node.body, context)
+        self.inlined_arguments.pop()
+        if (
+            body_res.error
+            or body_res.value.get_type_spec().get_form() != node.return_form
+        ):
+            return self.visit(node.call, context)
+
+        return res.success(
+            body_res.value.set_context(context).set_pos(node.line, node.column)
+        )
+
+    def visit_InlinedArgumentNode(self, node, context):
+        return RTResult().success(self.inlined_arguments[-1][node.index])
+
+    def spend(self, node, context):
+        # counts a step of the program, a loop iteration or a call, and gives
+        # the error to report once the budget is exceeded
+        budget = self.budget
+        budget.steps += 1
+        if budget.steps < budget.next_check:
+            return None
+        try:
+            budget.check()
+        except BudgetExceeded as exceeded:
+            return self.budget_error(node, context, exceeded)
+        return None
+
+    def allocate(self, node, context, string):
+        # counts a string built against the memory budget
+        try:
+            self.budget.allocate(string.length())
+        except BudgetExceeded as exceeded:
+            return self.budget_error(node, context, exceeded)
+        return None
+
+    def budget_error(self, node, context, exceeded):
+        error_name, details = exceeded.args
+        return RTError(
+            self.source_code_listing.get(node.line),
+            node.line,
+            node.column,
+            error_name,
+            details,
+            context,
+            self.file,
+        )
+
+    def compiled_function(self, fn):
+        # the compiled version of a function, or None while it is not hot or
+        # when it can not be compiled
+        if fn in self.compiled_functions:
+            return self.compiled_functions[fn]
+        calls = self.call_counts.get(fn, 0) + 1
+        self.call_counts[fn] = calls
+        if Interpreter.COMPILE_THRESHOLD <= 0 or calls < Interpreter.COMPILE_THRESHOLD:
+            return None
+        self.compiled_functions[fn] = FunctionCompiler(self).compile(fn)
+        return self.compiled_functions[fn]
+
+    #######################################################################################
+
     def visit_SwitchCaseNode(self, node, context):
         # token - the 'switch' token
         # switch_expr_node - expression to switch
@@ -5238,6 +7584,9 @@ class Interpreter:
                 return res
             if condition.value is not True or should_break:
                 break
+            error = self.spend(node, context)
+            if error:
+                return res.failure(error)
             inner_for_context = ForContext("for", for_context, node.line)
             for stmt in stmts:
                 value = res.register(self.visit(stmt, inner_for_context))
@@ -5788,6 +8137,8 @@ class Interpreter:
             string_form = "null"
         elif form == TypeForm.UNDEFINED:
             string_form = "undefined"
+        elif form == TypeForm.RANGE:
+            string_form = "range"
         elif form == TypeForm.ARRAY or form == TypeForm.MATRIX:
             string_form = (
                 value.get_type_spec().get_base_type().get_identifier().name
@@ -5817,24 +8168,19 @@ class Interpreter:
         # 	self.column = token.lexpos
         res = RTResult()
 
-        # The for context
-        for_context = ForContext("for", context, node.line)
-
-        # Enter the control variable to the for context
-        for_context.enter(node.left)
-
-        # Figure out the type of the first element of the array to iterate
+        # Evaluate the expression to iterate
         right = res.register(self.visit(node.right, context))
         if res.should_return():
             return res
 
+        # Arrays, matrices, strings and ranges are iterated lazily, one element at a time
         if (
             right.get_type_spec().get_form() == TypeForm.ARRAY
             or right.get_type_spec().get_form() == TypeForm.MATRIX
+            or right.get_type_spec().get_form() == TypeForm.STRING
+            or right.get_type_spec().get_form() == TypeForm.RANGE
         ):
-            arr = right
-        elif right.get_type_spec().get_form() == TypeForm.STRING:
-            arr = right.to_array()
+            elements = right.iterate()
         else:
             return res.failure(
                 RTError(
@@ -5848,13 +8194,6 @@ class Interpreter:
                 )
             )
 
-        # no point going any further since the array is empty
-        if arr.is_empty():
-            return res.success(
-                Undefined().set_context(context).set_pos(node.line, node.column)
-            )
-
-        # The type of the element array
         # The for context
         for_context = ForContext("for", context, node.line)
         # Enter the control variable to the for context
@@ -5865,7 +8204,10 @@ class Interpreter:
         stmts = node.block.statements
         should_continue = False
         should_break = False
-        for element in arr.elements:
+        for element in elements:
+            error = self.spend(node, context)
+            if error:
+                return res.failure(error)
             entry.set_attribute(SymtabKey.RUNTIME_VALUE, element)
             inner_for_context = ForContext("for", for_context, node.line)
             for stmt in stmts:
@@ -5895,9 +8237,2685 @@ class Interpreter:
         )
 
 
+# ------------------------------------------------------------------------------------
+#                                 OPTIMIZER
+# ------------------------------------------------------------------------------------
+
+
+class ASTTransformer:
+    # The fields of every node that hold child nodes evaluated by the interpreter.
+    # Structural children (names, type specs, assignment targets, field names)
+    # are left out on purpose, passes must never rewrite them.
+    AST_CHILDREN = {
+        "ArithmeticOperationNode": ("left", "right"),
+        "RelationalOperationNode": ("left", "right"),
+        "LogicalOperationNode": ("left", "right"),
+        "EqualityOperationNode": ("left", "right"),
+        "UnaryOperationNode": ("expr_node",),
+        "TypeOfNode": ("expr_node",),
+        "VarDeclarationNode": ("init_expr_node",),
+        "ConsoleLogNode": ("arguments",),
+        "ObjectKeysNode": ("argument",),
+        "ObjectValuesNode": ("argument",),
+        "MemberSetExpression": ("lvalue", "rvalue"),
+        "ArraySetExpression": ("lvalue", "target", "rvalue"),
+        "ArrayAccessNode": ("left", "right"),
+        "CallExprNode": ("arguments",),
+        "MemberAccessNode": ("left",),
+        "BlockNode": ("statements",),
+        "ProgramNode": ("statements",),
+        "ReturnNode": ("expr_node",),
+        "IfElseNode": ("expr_node", "consequence", "alternative"),
+        "WhileNode": ("expr_node", "block"),
+        "AssignNode": ("rvalue",),
+        "BuiltinPush": ("arr", "argument"),
+        "BuiltinIndexOf": ("arr", "argument"),
+        "BuiltinPop": ("arr",),
+        "BuiltinLength": ("arr",),
+        "BuiltinParseInt": ("argument",),
+        "BuiltinParseFloat": ("argument",),
+        "BuiltinToString": ("argument",),
+        "BuiltinToLowerCase": ("argument",),
+        "BuiltinToUpperCase": ("argument",),
+        "BuiltinJoin": ("arr",),
+        "BuiltinMath": ("arguments",),
+        "ArrayNode": ("elements",),
+        "FunctionNode": ("body",),
+        "InterfaceExprNode": ("expr_fields",),
+        "FieldExprNode": ("expr_node",),
+        "SwitchCaseNode": ("switch_expr_node", "cases_node", "default_case_node"),
+        "CaseNode": ("case_expr_node", "statements"),
+        "DefaultCaseNode": ("statements",),
+        "ForNode": ("init_node", "test_node", "update_node", "statements"),
+        "ForOfNode": ("right", "block"),
+        "TernaryOperationNode": ("expr_node", "true_expr", "false_expr"),
+        "IntArithmeticOperationNode": ("left", "right"),
+        "FloatArithmeticOperationNode": ("left", "right"),
+        "StringConcatOperationNode": ("left", "right"),
+        "NumberRelationalOperationNode": ("left", "right"),
+        "HoistingLoopNode": ("loop",),
+        "HoistedNode": ("expr_node",),
+        "InlinedCallNode": ("arguments",),
+    }
+
+    # expressions without side effects, evaluating them again changes nothing
+    PURE_NODES = (
+        ArithmeticOperationNode,
+        RelationalOperationNode,
+        EqualityOperationNode,
+        LogicalOperationNode,
+        UnaryOperationNode,
+        TernaryOperationNode,
+        TypeOfNode,
+        BuiltinLength,
+        ArrayAccessNode,
+        MemberAccessNode,
+        ConstantNode,
+        IdentifierNode,
+        NumberLiteralNode,
+        FloatLiteralNode,
+        StringLiteralNode,
+        BooleanLiteralNode,
+        CharLiteralNode,
+        NullLiteralNode,
+    )
+
+    # declarations of these types may be resolved at compile time
+    PRIMITIVE_TYPES = ("number", "float", "string", "boolean", "char")
+
+    def __init__(self, interpreter, context, report):
+        self.interpreter = interpreter
+        self.context = context
+        # a list of messages describing what the pass did, for the debug view
+        self.report = report
+
+    def transform(self, node):
+        method_name = f"transform_{type(node).__name__}"
+        method = getattr(self, method_name, self.generic_transform)
+        return method(node)
+
+    def transform_child(self, child):
+        if child is None:
+            return None
+        if isinstance(child, list):
+            new_children = [self.transform(element) for element in child]
+            if all(new is old for new, old in zip(new_children, child)):
+                return child
+            return new_children
+        return self.transform(child)
+
+    def generic_transform(self, node):
+        # Copy on write: the parser's tree is never modified, a node is only
+        # copied when one of its children changed.
+        changes = {}
+        for field in self.AST_CHILDREN.get(type(node).__name__, ()):
+            old_child = getattr(node, field)
+            new_child = self.transform_child(old_child)
+            if new_child is not old_child:
+                changes[field] = new_child
+        if not changes:
+            return node
+        new_node = copy.copy(node)
+        for field, new_child in changes.items():
+            setattr(new_node, field, new_child)
+        return new_node
+
+    def children(self, node):
+        # the evaluated children of a node
+        for field in self.AST_CHILDREN.get(type(node).__name__, ()):
+            child = getattr(node, field)
+            if isinstance(child, list):
+                yield from child
+            elif child is not None:
+                yield child
+
+    def walk(self, node):
+        # every node in the subtree, structural children included
+        if isinstance(node, list):
+            for element in node:
+                yield from self.walk(element)
+            return
+        if not hasattr(node, "line"):
+            return
+        yield node
+        if isinstance(node, ConstantNode):
+            return
+        for child in vars(node).values():
+            if isinstance(child, list) or hasattr(child, "line"):
+                yield from self.walk(child)
+
+    def has_constant_init(self, node):
+        # a declaration initialized with a constant of exactly the declared
+        # primitive type, it can not fail the type check at runtime
+        return (
+            isinstance(node.init_expr_node, ConstantNode)
+            and isinstance(node.type_spec_node, TypeNode)
+            and node.type_spec_node.dims == 0
+            and node.type_spec_node.type_ in self.PRIMITIVE_TYPES
+            and node.type_spec_node.type_
+            == self.interpreter.get_name_of_type(node.init_expr_node.value)
+        )
+
+
+#######################################################################################
+
+
+class ConstantFolder(ASTTransformer):
+    # Replaces literals and operations over constants with prebuilt values
+    # and propagates primitive 'const' declarations.
+
+    def __init__(self, interpreter, context, report):
+        super().__init__(interpreter, context, report)
+        # A stack of scopes, one for each context the interpreter creates.
+        # Every scope maps a name to its constant value, or None when the
+        # name is not a propagated constant.
+        self.scopes = [{}]
+
+    def evaluate(self, node):
+        # the interpreter computes the value, so folding can not change semantics.
+        # Errors are left for the runtime to report with the right context.
+        res = self.interpreter.visit(node, self.context)
+        if res.error:
+            return node
+        return ConstantNode(node, res.value)
+
+    def fold(self, node):
+        node = self.generic_transform(node)
+        for field in self.AST_CHILDREN[type(node).__name__]:
+            if not isinstance(getattr(node, field), ConstantNode):
+                return node
+        return self.evaluate(node)
+
+    transform_NumberLiteralNode = evaluate
+    transform_FloatLiteralNode = evaluate
+    transform_StringLiteralNode = evaluate
+    transform_BooleanLiteralNode = evaluate
+    transform_CharLiteralNode = evaluate
+    transform_ArithmeticOperationNode = fold
+    transform_RelationalOperationNode = fold
+    transform_LogicalOperationNode = fold
+    transform_EqualityOperationNode = fold
+    transform_UnaryOperationNode = fold
+
+    def transform_TernaryOperationNode(self, node):
+        node = self.generic_transform(node)
+        if isinstance(node.expr_node, ConstantNode) and isinstance(
+            node.expr_node.value, Boolean
+        ):
+            return node.true_expr if node.expr_node.value.value else node.false_expr
+        return node
+
+    # --------------------------------------- scopes ---------------------------------------
+
+    def lookup(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return None
+
+    def declare(self, name, value=None):
+        # a second declaration in the same scope fails at runtime, the first one stays
+        if name not in self.scopes[-1]:
+            self.scopes[-1][name] = value
+
+    def in_new_scope(self, transform, node, names=()):
+        self.scopes.append({name: None for name in names})
+        try:
+            return transform(node)
+        finally:
+            self.scopes.pop()
+
+    def transform_IdentifierNode(self, node):
+        value = self.lookup(node.name)
+        if value is None:
+            return node
+        return ConstantNode(node, value)
+
+    def transform_VarDeclarationNode(self, node):
+        node = self.generic_transform(node)
+        value = None
+        if node.is_constant and self.has_constant_init(node):
+            value = node.init_expr_node.value
+        self.declare(node.identifier_node.token.value, value)
+        return node
+
+    def transform_BlockNode(self, node):
+        return self.in_new_scope(self.generic_transform, node)
+
+    def transform_CaseNode(self, node):
+        return self.in_new_scope(self.generic_transform, node)
+
+    def transform_DefaultCaseNode(self, node):
+        return self.in_new_scope(self.generic_transform, node)
+
+    def transform_ForNode(self, node):
+        return self.in_new_scope(self.generic_transform, node)
+
+    def transform_ForOfNode(self, node):
+        # the iterable is evaluated before the control variable exists
+        right = self.transform(node.right)
+        block = self.in_new_scope(self.transform, node.block, names=(node.left,))
+        if right is node.right and block is node.block:
+            return node
+        new_node = copy.copy(node)
+        new_node.right = right
+        new_node.block = block
+        return new_node
+
+    def transform_FunctionNode(self, node):
+        # Scoping is dynamic, a name inside a function body may resolve to any
+        # caller's variable, so the body only sees its own declarations.
+        # Parameters and body statements share the function context.
+        outer_scopes = self.scopes
+        self.scopes = [
+            {param.parameter_name.token.value: None for param in node.parameters}
+        ]
+        try:
+            statements = self.transform_child(node.body.statements)
+        finally:
+            self.scopes = outer_scopes
+        if statements is node.body.statements:
+            return node
+        new_node = copy.copy(node)
+        new_node.body = copy.copy(node.body)
+        new_node.body.statements = statements
+        return new_node
+
+
+#######################################################################################
+
+
+class DeadCodeEliminator(ASTTransformer):
+    # Removes statements that can never run and declarations nobody reads.
+
+    def transform_ProgramNode(self, node):
+        # statements after a top level 'return', 'break' or 'continue' still run,
+        # the program goes on after any error.
+        statements = [
+            new_statement
+            for new_statement in (self.transform(stmt) for stmt in node.statements)
+            if new_statement is not None
+        ]
+        if self.is_same_list(statements, node.statements):
+            return node
+        new_node = copy.copy(node)
+        new_node.statements = statements
+        return new_node
+
+    def transform_BlockNode(self, node):
+        return self.with_statements(node, self.transform_statements(node.statements))
+
+    def transform_CaseNode(self, node):
+        # the statements are transformed once, here, only the expression is left
+        node = self.with_statements(node, self.transform_statements(node.statements))
+        case_expr_node = self.transform(node.case_expr_node)
+        if case_expr_node is node.case_expr_node:
+            return node
+        new_node = copy.copy(node)
+        new_node.case_expr_node = case_expr_node
+        return new_node
+
+    def transform_DefaultCaseNode(self, node):
+        return self.with_statements(node, self.transform_statements(node.statements))
+
+    def transform_FunctionNode(self, node):
+        # parameters live in the same context as the body statements
+        parameters = [param.parameter_name.token.value for param in node.parameters]
+        body = self.with_statements(
+            node.body, self.transform_statements(node.body.statements, parameters)
+        )
+        if body is node.body:
+            return node
+        new_node = copy.copy(node)
+        new_node.body = body
+        return new_node
+
+    def transform_IfElseNode(self, node):
+        node = self.generic_transform(node)
+        if not isinstance(node.expr_node, ConstantNode) or not isinstance(
+            node.expr_node.value, Boolean
+        ):
+            return node
+
+        if node.expr_node.value.value:
+            if node.alternative is None:
+                return node
+            self.report.append(
+                f"line {node.alternative.line}: removed dead 'else' branch"
+            )
+            new_node = copy.copy(node)
+            new_node.alternative = None
+            return new_node
+
+        self.report.append(f"line {node.line}: removed dead 'if' branch")
+        if node.alternative is None or isinstance(node.alternative, IfElseNode):
+            return node.alternative
+        # the else block keeps its own context
+        new_node = copy.copy(node)
+        new_node.expr_node = ConstantNode(node.expr_node, Boolean(True))
+        new_node.consequence = node.alternative
+        new_node.alternative = None
+        return new_node
+
+    def transform_WhileNode(self, node):
+        node = self.generic_transform(node)
+        if (
+            isinstance(node.expr_node, ConstantNode)
+            and isinstance(node.expr_node.value, Boolean)
+            and node.expr_node.value.value is False
+        ):
+            self.report.append(
+                f"line {node.line}: removed 'while' loop that never runs"
+            )
+            return None
+        return node
+
+    def transform_statements(self, statements, declared=()):
+        new_statements = []
+        for index, stmt in enumerate(statements):
+            new_statement = self.transform(stmt)
+            if new_statement is not None:
+                new_statements.append(new_statement)
+            # nothing after a jump runs, not even after a failing one
+            if isinstance(stmt, (ReturnNode, BreakNode, ContinueNode)):
+                for unreachable in statements[index + 1 :]:
+                    self.report.append(
+                        f"line {unreachable.line}: removed unreachable statement"
+                    )
+                break
+
+        # A declaration that can not fail and is never read is only kept in the
+        # symbols report. Scoping is dynamic, so any later call could read it.
+        declared = set(declared)
+        for index, stmt in enumerate(new_statements):
+            if not isinstance(stmt, VarDeclarationNode):
+                continue
+            name = stmt.identifier_node.token.value
+            if (
+                name not in declared
+                and self.has_constant_init(stmt)
+                and not self.is_read(name, new_statements[index + 1 :])
+            ):
+                new_statements[index] = DeclarationSymbolNode(
+                    stmt, self.interpreter.get_name_of_type(stmt.init_expr_node.value)
+                )
+                self.report.append(
+                    f"line {stmt.line}: removed unused declaration of '{name}'"
+                )
+            declared.add(name)
+
+        return new_statements
+
+    def is_read(self, name, statements):
+        for node in self.walk(statements):
+            if isinstance(node, CallExprNode):
+                return True
+            if isinstance(node, IdentifierNode) and node.name == name:
+                return True
+        return False
+
+    def is_same_list(self, new_list, old_list):
+        return len(new_list) == len(old_list) and all(
+            new is old for new, old in zip(new_list, old_list)
+        )
+
+    def with_statements(self, node, statements):
+        if self.is_same_list(statements, node.statements):
+            return node
+        new_node = copy.copy(node)
+        new_node.statements = statements
+        return new_node
+
+
+#######################################################################################
+
+
+class LoopInvariantHoister(ASTTransformer):
+    # Moves expressions whose value can not change while a loop runs into
+    # engine only slots, they are computed on first use and reused by the
+    # following iterations.
+
+    # expressions worth hoisting
+    CANDIDATES = (
+        ArithmeticOperationNode,
+        RelationalOperationNode,
+        EqualityOperationNode,
+        LogicalOperationNode,
+        UnaryOperationNode,
+        TernaryOperationNode,
+        TypeOfNode,
+        BuiltinLength,
+        ArrayAccessNode,
+        MemberAccessNode,
+    )
+
+    # nodes that read arrays or interfaces, their value changes when they are mutated
+    MEMORY_READS = (BuiltinLength, ArrayAccessNode, MemberAccessNode)
+    MUTATIONS = (BuiltinPush, BuiltinPop, ArraySetExpression, MemberSetExpression)
+
+    def __init__(self, interpreter, context, report):
+        super().__init__(interpreter, context, report)
+        # the loops being transformed, outermost first. Every loop keeps the
+        # names written inside it, if it mutates memory and its slots.
+        self.loops = []
+        self.next_slot = 0
+
+    def transform_WhileNode(self, node):
+        return self.hoist(node)
+
+    def transform_ForNode(self, node):
+        return self.hoist(node)
+
+    def transform_ForOfNode(self, node):
+        # the iterable is evaluated once, before the loop starts
+        right = self.transform(node.right)
+        if right is not node.right:
+            node = copy.copy(node)
+            node.right = right
+        return self.hoist(node, fields=("block",), names=(node.left,))
+
+    def hoist(self, node, fields=None, names=()):
+        loop_nodes = list(self.walk(node))
+        # Scoping is dynamic, any call may write any variable
+        if any(isinstance(n, (CallExprNode, FunctionNode)) for n in loop_nodes):
+            outer_loops = self.loops
+            self.loops = []
+            try:
+                return self.generic_transform(node)
+            finally:
+                self.loops = outer_loops
+
+        written = set(names)
+        for n in loop_nodes:
+            if isinstance(n, VarDeclarationNode):
+                written.add(n.identifier_node.token.value)
+            elif isinstance(n, AssignNode):
+                written.add(n.target.token.value)
+            elif isinstance(n, ForOfNode):
+                written.add(n.left)
+        loop = {
+            "written": written,
+            "mutates": any(isinstance(n, self.MUTATIONS) for n in loop_nodes),
+            "slots": [],
+        }
+
+        self.loops.append(loop)
+        try:
+            if fields is None:
+                new_node = self.generic_transform(node)
+            else:
+                new_node = node
+                for field in fields:
+                    child = getattr(node, field)
+                    new_child = self.transform_child(child)
+                    if new_child is not child:
+                        if new_node is node:
+                            new_node = copy.copy(node)
+                        setattr(new_node, field, new_child)
+        finally:
+            self.loops.pop()
+
+        if not loop["slots"]:
+            return new_node
+        return HoistingLoopNode(new_node, loop["slots"])
+
+    def is_invariant(self, node, loop):
+        for n in self.walk(node):
+            if not isinstance(n, self.PURE_NODES):
+                return False
+            if isinstance(n, IdentifierNode) and n.name in loop["written"]:
+                return False
+            if isinstance(n, self.MEMORY_READS) and loop["mutates"]:
+                return False
+            # the target of an array or member set expression
+            if isinstance(n, (ArrayAccessNode, MemberAccessNode)) and n.right is None:
+                return False
+        return True
+
+    def transform(self, node):
+        if self.loops and isinstance(node, self.CANDIDATES):
+            # hoist as far out as possible
+            for loop in self.loops:
+                if self.is_invariant(node, loop):
+                    slot = self.next_slot
+                    self.next_slot += 1
+                    loop["slots"].append(slot)
+                    self.report.append(
+                        f"line {node.line}: hoisted loop invariant expression"
+                        f" into slot {slot}"
+                    )
+                    return HoistedNode(slot, node)
+        return super().transform(node)
+
+
+#######################################################################################
+
+
+class FunctionInliner(ASTTransformer):
+    # Replaces calls to small functions with the expression they return.
+    # A function is inlined when its body is a single 'return' of a pure
+    # expression, its parameters and return type are primitive and it is
+    # defined only once.
+
+    # the largest return expression inlined, in nodes. 0 disables the pass
+    MAX_SIZE = 24
+
+    TYPE_FORMS = {
+        "number": TypeForm.NUMBER,
+        "float": TypeForm.FLOAT,
+        "string": TypeForm.STRING,
+        "boolean": TypeForm.BOOLEAN,
+        "char": TypeForm.CHAR,
+    }
+
+    def __init__(self, interpreter, context, report):
+        super().__init__(interpreter, context, report)
+        # function name -> FunctionNode, for every function that can be inlined
+        self.functions = {}
+
+    def transform_ProgramNode(self, node):
+        if FunctionInliner.MAX_SIZE <= 0:
+            return node
+        definitions = {}
+        for n in self.walk(node):
+            if isinstance(n, FunctionNode):
+                definitions.setdefault(n.name.token.value, []).append(n)
+        for name, functions in definitions.items():
+            if len(functions) == 1 and self.is_inlinable(functions[0]):
+                self.functions[name] = functions[0]
+        if not self.functions:
+            return node
+        return self.generic_transform(node)
+
+    def primitive_form(self, type_spec_node):
+        if not isinstance(type_spec_node, TypeNode) or type_spec_node.dims != 0:
+            return None
+        return self.TYPE_FORMS.get(type_spec_node.type_)
+
+    def is_inlinable(self, node):
+        statements = node.body.statements
+        if len(statements) != 1 or not isinstance(statements[0], ReturnNode):
+            return False
+        if statements[0].expr_node is None:
+            return False
+        if self.primitive_form(node.ret_type_spec) is None:
+            return False
+        names = [param.parameter_name.token.value for param in node.parameters]
+        if len(set(names)) != len(names):
+            return False
+        for param in node.parameters:
+            if self.primitive_form(param.parameter_type_spec) is None:
+                return False
+        # a pure expression has no calls, so the function is not recursive
+        body = list(self.walk(statements[0].expr_node))
+        if len(body) > FunctionInliner.MAX_SIZE:
+            return False
+        return all(isinstance(n, self.PURE_NODES) for n in body)
+
+    def is_pure(self, node):
+        if isinstance(node, InlinedCallNode):
+            return all(self.is_pure(argument) for argument in node.arguments)
+        if not isinstance(node, self.PURE_NODES):
+            return False
+        return all(self.is_pure(child) for child in self.children(node))
+
+    def transform_CallExprNode(self, node):
+        node = self.generic_transform(node)
+        if not isinstance(node.caller, IdentifierNode):
+            return node
+        function = self.functions.get(node.caller.token.value)
+        if function is None or len(node.arguments) != len(function.parameters):
+            return node
+        # the full call runs when a guard fails, it evaluates the arguments again
+        if not all(self.is_pure(argument) for argument in node.arguments):
+            return node
+
+        self.report.append(
+            f"line {node.line}: inlined call to '{node.caller.token.value}'"
+        )
+        return InlinedCallNode(
+            node,
+            function,
+            [self.primitive_form(p.parameter_type_spec) for p in function.parameters],
+            self.primitive_form(function.ret_type_spec),
+            ParameterReplacer(function).transform(
+                function.body.statements[0].expr_node
+            ),
+        )
+
+
+#######################################################################################
+
+
+class ParameterReplacer(ASTTransformer):
+    # Makes the parameters of an inlined function read the call arguments
+    def __init__(self, function):
+        self.parameters = [
+            param.parameter_name.token.value for param in function.parameters
+        ]
+
+    def transform_IdentifierNode(self, node):
+        if node.name in self.parameters:
+            return InlinedArgumentNode(node, self.parameters.index(node.name))
+        return node
+
+
+#######################################################################################
+
+
+class Optimizer:
+    # Runs the optimization passes over a parsed program. The tree produced by
+    # the parser is left intact, every pass returns a new tree.
+    def __init__(self, interpreter, context):
+        self.interpreter = interpreter
+        self.context = context
+        self.passes = [
+            ConstantFolder,
+            DeadCodeEliminator,
+            LoopInvariantHoister,
+            FunctionInliner,
+        ]
+        # what the passes did, see the 'debug' option of /eval
+        self.report = []
+
+    def optimize(self, ast):
+        for optimization_pass in self.passes:
+            ast = optimization_pass(
+                self.interpreter, self.context, self.report
+            ).transform(ast)
+        return ast
+
+    def report_as_string(self):
+        return "\n".join(self.report)
+
+
+# ------------------------------------------------------------------------------------
+#                                 COMPILER
+# ------------------------------------------------------------------------------------
+
+
+class CompiledFunctionDeopt(Exception):
+    # Raised by compiled code when the interpreter has to run the call instead
+    pass
+
+
+class UnsupportedFunction(Exception):
+    # Raised while translating a function the compiler can not handle
+    pass
+
+
+def compiled_div(left, right):
+    # Number.__truediv__, numbers only stay numbers when the division is exact
+    if right == 0:
+        raise CompiledFunctionDeopt()
+    result = left / right
+    if type(left) is int and type(right) is int and result.is_integer():
+        return int(result)
+    return result
+
+
+def compiled_mod(left, right):
+    # the modulo is only defined between numbers
+    if right == 0 or type(left) is float or type(right) is float:
+        raise CompiledFunctionDeopt()
+    return left % right
+
+
+class FunctionCompiler:
+    # Translates hot functions into Python source. Only functions made of
+    # number, float and boolean locals are supported: every name must be a
+    # parameter or a local declaration, and the only calls allowed are to
+    # other functions that can be compiled too. Such functions have no side
+    # effects besides the symbols report, so whenever the compiled code meets
+    # something unexpected it raises CompiledFunctionDeopt and the interpreter
+    # runs the whole call again.
+
+    # the compiler only knows two kinds of values, numbers may be ints or floats
+    TYPE_KINDS = {"number": "num", "float": "num", "boolean": "bool"}
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        # FunctionNode -> compiled python function, for every function compiled together
+        self.compiled = {}
+
+    def compile(self, fn):
+        try:
+            self.translate(fn)
+        except (UnsupportedFunction, RecursionError):
+            return None
+        return self.compiled[fn]
+
+    def translate(self, fn):
+        if fn in self.compiled:
+            return
+        # recursive calls find the function already registered
+        self.compiled[fn] = None
+        translator = FunctionTranslator(self, fn)
+        source = translator.translate()
+        namespace = {
+            "_div": compiled_div,
+            "_mod": compiled_mod,
+            "CompiledFunctionDeopt": CompiledFunctionDeopt,
+            "_invoke": self.invoker(translator.callees),
+            "_symbol": self.symbol_recorder(translator.declarations),
+            "_budget": self.interpreter.budget,
+        }
+        exec(compile(source, f"<compiled {fn.name.token.value}>", "exec"), namespace)
+        self.compiled[fn] = namespace[translator.function_name]
+
+    def callee(self, name):
+        fn = self.interpreter.global_context.lookup_function(name)
+        if fn is None:
+            raise UnsupportedFunction(name)
+        self.translate(fn)
+        return fn
+
+    def invoker(self, callees):
+        # callees - a map of function names to the FunctionNodes compiled for them
+        global_context = self.interpreter.global_context
+        compiled = self.compiled
+
+        def invoke(name, *args):
+            fn = global_context.lookup_function(name)
+            if fn is not callees[name]:
+                raise CompiledFunctionDeopt()
+            return compiled[fn](*args)
+
+        return invoke
+
+    def symbol_recorder(self, declarations):
+        # declarations - for every declaration: name, symbol type, type name
+        # (None when it depends on the value), context name, line and column
+        symbols = self.interpreter.symbols
+        recorded = {}
+
+        def record(index, value):
+            name, symbol_type, type_name, context_name, line, column = declarations[
+                index
+            ]
+            if type_name is None:
+                if type(value) is bool:
+                    type_name = "boolean"
+                elif type(value) is int:
+                    type_name = "number"
+                else:
+                    type_name = "float"
+            # the symbol only changes along with the type of the value
+            if recorded.get(index) == type_name and (name, line, column) in symbols:
+                return
+            recorded[index] = type_name
+            symbols[(name, line, column)] = Symbol(
+                name, symbol_type, type_name, context_name, line, column
+            )
+
+        return record
+
+
+#######################################################################################
+
+
+class FunctionTranslator:
+    # Writes the Python source for one function, see FunctionCompiler
+    def __init__(self, compiler, fn):
+        self.compiler = compiler
+        self.fn = fn
+        self.function_name = None
+        self.lines = []
+        self.indentation = 1
+        # a stack of scopes, a scope maps names to (python name, kind, is_constant),
+        # names that can not be assigned count as constants
+        self.scopes = []
+        # the update statements of the enclosing loops, None for while loops
+        self.loops = []
+        self.callees = {}
+        self.declarations = []
+        self.next_local = 0
+
+    def unsupported(self, node):
+        raise UnsupportedFunction(type(node).__name__)
+
+    def emit(self, line):
+        self.lines.append("    " * self.indentation + line)
+
+    def kind_of_type(self, type_spec_node):
+        if not isinstance(type_spec_node, TypeNode) or type_spec_node.dims != 0:
+            self.unsupported(type_spec_node)
+        kind = FunctionCompiler.TYPE_KINDS.get(type_spec_node.type_)
+        if kind is None:
+            self.unsupported(type_spec_node)
+        return kind
+
+    def declare(self, name, kind, is_constant=False):
+        # a second declaration in the same context is a runtime error
+        if name in self.scopes[-1]:
+            raise UnsupportedFunction(name)
+        python_name = f"v{self.next_local}_{name}"
+        self.next_local += 1
+        self.scopes[-1][name] = (python_name, kind, is_constant)
+        return python_name
+
+    def lookup(self, node):
+        for scope in reversed(self.scopes):
+            if node.name in scope:
+                return scope[node.name]
+        # a name of the caller, scoping is dynamic
+        self.unsupported(node)
+
+    def translate(self):
+        fn = self.fn
+        self.function_name = f"olc_{fn.name.token.value}"
+        self.return_kind = self.kind_of_type(fn.ret_type_spec)
+        self.context_name = fn.name.token.value
+        self.scopes.append({})
+        parameters = []
+        for param in fn.parameters:
+            kind = self.kind_of_type(param.parameter_type_spec)
+            # the interpreter can not assign to parameters, they have no type spec
+            parameters.append(
+                self.declare(param.parameter_name.token.value, kind, is_constant=True)
+            )
+
+        header = f"def {self.function_name}({', '.join(parameters)}):"
+        self.spend()
+        self.statements(fn.body.statements)
+        # the function ended without a return, the interpreter reports it
+        self.emit("raise CompiledFunctionDeopt()")
+        return "\n".join([header] + self.lines) + "\n"
+
+    # ------------------------------------- statements -------------------------------------
+
+    def statements(self, statements, context_name=None):
+        if context_name is not None:
+            outer_context_name = self.context_name
+            self.context_name = context_name
+            self.scopes.append({})
+        for stmt in statements:
+            method = getattr(self, f"statement_{type(stmt).__name__}", self.unsupported)
+            method(stmt)
+        self.emit("pass")
+        if context_name is not None:
+            self.scopes.pop()
+            self.context_name = outer_context_name
+
+    def spend(self):
+        # a step of the ExecutionBudget of the interpreter, see Interpreter.spend
+        self.emit("_budget.steps += 1")
+        self.emit("if _budget.steps >= _budget.next_check:")
+        self.emit("    _budget.check()")
+
+    def record_symbol(self, node, name, is_constant, type_name, python_name):
+        self.declarations.append(
+            (
+                name,
+                "constant" if is_constant else "variable",
+                type_name,
+                self.context_name,
+                node.token.lineno,
+                node.token.lexpos,
+            )
+        )
+        self.emit(f"_symbol({len(self.declarations) - 1}, {python_name})")
+
+    def statement_VarDeclarationNode(self, node):
+        if node.type_spec_node is None or node.init_expr_node is None:
+            self.unsupported(node)
+        kind = self.kind_of_type(node.type_spec_node)
+        source, value_kind = self.expression(node.init_expr_node)
+        if value_kind != kind:
+            self.unsupported(node)
+        name = node.identifier_node.token.value
+        python_name = self.declare(name, kind, node.is_constant)
+        self.emit(f"{python_name} = {source}")
+        self.record_symbol(node, name, node.is_constant, None, python_name)
+
+    def statement_DeclarationSymbolNode(self, node):
+        # the optimizer removed the declaration, the name is never read
+        python_name = self.declare(node.name, None, node.is_constant)
+        self.record_symbol(node, node.name, node.is_constant, node.type_name, "None")
+
+    def statement_AssignNode(self, node):
+        python_name, kind, is_constant = self.lookup(node.target)
+        source, value_kind = self.expression(node.rvalue)
+        if is_constant or kind is None or value_kind != kind:
+            self.unsupported(node)
+        self.emit(f"{python_name} = {source}")
+
+    def statement_ReturnNode(self, node):
+        if node.expr_node is None:
+            self.unsupported(node)
+        source, kind = self.expression(node.expr_node)
+        if kind != self.return_kind:
+            self.unsupported(node)
+        self.emit(f"return {source}")
+
+    def statement_IfElseNode(self, node):
+        source, kind = self.expression(node.expr_node)
+        if kind != "bool":
+            self.unsupported(node)
+        self.emit(f"if {source}:")
+        self.indentation += 1
+        self.statements(node.consequence.statements, "if")
+        self.indentation -= 1
+        if node.alternative is None:
+            return
+        self.emit("else:")
+        self.indentation += 1
+        if isinstance(node.alternative, IfElseNode):
+            self.statement_IfElseNode(node.alternative)
+        else:
+            self.statements(node.alternative.statements, "if")
+        self.indentation -= 1
+
+    def statement_WhileNode(self, node):
+        source, kind = self.expression(node.expr_node)
+        if kind != "bool":
+            self.unsupported(node)
+        self.emit(f"while {source}:")
+        self.indentation += 1
+        self.spend()
+        self.loops.append(None)
+        self.statements(node.block.statements, "while")
+        self.loops.pop()
+        self.indentation -= 1
+
+    def statement_ForNode(self, node):
+        # the declarations, the test and the updates share the 'for' context
+        outer_context_name = self.context_name
+        self.context_name = "for"
+        self.scopes.append({})
+        for declaration in node.init_node:
+            if not isinstance(declaration, VarDeclarationNode):
+                self.unsupported(declaration)
+            self.statement_VarDeclarationNode(declaration)
+        test, kind = self.expression(node.test_node)
+
+        # translate the updates once, a 'continue' repeats them
+        lines, indentation = self.lines, self.indentation
+        self.lines, self.indentation = [], 0
+        for update in node.update_node:
+            if not isinstance(update, AssignNode):
+                self.unsupported(update)
+            self.statement_AssignNode(update)
+        updates = self.lines
+        self.lines, self.indentation = lines, indentation
+
+        # the loop stops on anything but true
+        self.emit(f"while ({test}) is True:")
+        self.indentation += 1
+        self.spend()
+        self.loops.append(updates)
+        self.statements(node.statements.statements, "for")
+        self.loops.pop()
+        for line in updates:
+            self.emit(line)
+        self.indentation -= 1
+        self.scopes.pop()
+        self.context_name = outer_context_name
+
+    def statement_BreakNode(self, node):
+        if not self.loops:
+            self.unsupported(node)
+        self.emit("break")
+
+    def statement_ContinueNode(self, node):
+        if not self.loops:
+            self.unsupported(node)
+        for line in self.loops[-1] or ():
+            self.emit(line)
+        self.emit("continue")
+
+    def statement_HoistingLoopNode(self, node):
+        method = getattr(
+            self, f"statement_{type(node.loop).__name__}", self.unsupported
+        )
+        method(node.loop)
+
+    # ------------------------------------- expressions -------------------------------------
+
+    def expression(self, node):
+        # returns the python source and the kind of the value
+        method = getattr(self, f"expression_{type(node).__name__}", self.unsupported)
+        return method(node)
+
+    def constant(self, value):
+        if isinstance(value, bool):
+            return repr(value), "bool"
+        if isinstance(value, str):
+            return repr(value), "str"
+        return repr(value), "num"
+
+    def expression_ConstantNode(self, node):
+        if isinstance(node.value, Boolean):
+            return self.constant(node.value.value)
+        if isinstance(node.value, Number):
+            return self.constant(node.value.value)
+        if isinstance(node.value, String):
+            return self.constant(str(node.value))
+        self.unsupported(node)
+
+    def expression_NumberLiteralNode(self, node):
+        return self.constant(int(node.token.value))
+
+    def expression_FloatLiteralNode(self, node):
+        return self.constant(float(node.token.value))
+
+    def expression_BooleanLiteralNode(self, node):
+        return self.constant(node.value)
+
+    def expression_StringLiteralNode(self, node):
+        # strings never reach a local, they are only compared, joined or logged
+        return self.constant(node.token.value)
+
+    def expression_IdentifierNode(self, node):
+        python_name, kind, is_constant = self.lookup(node)
+        if kind is None:
+            self.unsupported(node)
+        return python_name, kind
+
+    def expression_HoistedNode(self, node):
+        return self.expression(node.expr_node)
+
+    def operands(self, node, kind):
+        left, left_kind = self.expression(node.left)
+        right, right_kind = self.expression(node.right)
+        if left_kind != kind or right_kind != kind:
+            self.unsupported(node)
+        return left, right
+
+    def expression_ArithmeticOperationNode(self, node):
+        left, left_kind = self.expression(node.left)
+        right, right_kind = self.expression(node.right)
+        operator = node.operator.type
+        if operator == "PLUS" and left_kind == right_kind == "str":
+            return f"({left} + {right})", "str"
+        if left_kind != "num" or right_kind != "num":
+            self.unsupported(node)
+        if operator == "DIVIDE":
+            return f"_div({left}, {right})", "num"
+        if operator == "MOD":
+            return f"_mod({left}, {right})", "num"
+        symbol = {"PLUS": "+", "MINUS": "-", "TIMES": "*"}[operator]
+        return f"({left} {symbol} {right})", "num"
+
+    expression_IntArithmeticOperationNode = expression_ArithmeticOperationNode
+    expression_FloatArithmeticOperationNode = expression_ArithmeticOperationNode
+    expression_StringConcatOperationNode = expression_ArithmeticOperationNode
+
+    def expression_RelationalOperationNode(self, node):
+        left, right = self.operands(node, "num")
+        symbol = {"LT": "<", "LTE": "<=", "GT": ">", "GTE": ">="}[node.operator.type]
+        return f"({left} {symbol} {right})", "bool"
+
+    expression_NumberRelationalOperationNode = expression_RelationalOperationNode
+
+    def expression_EqualityOperationNode(self, node):
+        left, left_kind = self.expression(node.left)
+        right, right_kind = self.expression(node.right)
+        if left_kind != right_kind:
+            self.unsupported(node)
+        symbol = "==" if node.operator.type == "EQ_EQ" else "!="
+        return f"({left} {symbol} {right})", "bool"
+
+    def expression_LogicalOperationNode(self, node):
+        # both sides are always evaluated
+        left, right = self.operands(node, "bool")
+        symbol = "|" if node.operator.type == "OR" else "&"
+        return f"({left} {symbol} {right})", "bool"
+
+    def expression_UnaryOperationNode(self, node):
+        source, kind = self.expression(node.expr_node)
+        if node.operator.type == "MINUS":
+            if kind != "num":
+                self.unsupported(node)
+            return f"({source} * -1)", "num"
+        if kind != "bool":
+            self.unsupported(node)
+        return f"(not {source})", "bool"
+
+    def expression_TernaryOperationNode(self, node):
+        condition, condition_kind = self.expression(node.expr_node)
+        true_source, true_kind = self.expression(node.true_expr)
+        false_source, false_kind = self.expression(node.false_expr)
+        if condition_kind != "bool" or true_kind != false_kind:
+            self.unsupported(node)
+        return f"({true_source} if {condition} else {false_source})", true_kind
+
+    def expression_CallExprNode(self, node):
+        if not isinstance(node.caller, IdentifierNode):
+            self.unsupported(node)
+        name = node.caller.token.value
+        fn = self.compiler.callee(name)
+        if len(node.arguments) != len(fn.parameters):
+            self.unsupported(node)
+        arguments = []
+        for argument, param in zip(node.arguments, fn.parameters):
+            source, kind = self.expression(argument)
+            if kind != self.kind_of_type(param.parameter_type_spec):
+                self.unsupported(node)
+            arguments.append(source)
+        self.callees[name] = fn
+        return self.call(name, arguments), self.kind_of_type(fn.ret_type_spec)
+
+    def call(self, name, arguments):
+        # the callee may be redefined, _invoke checks it is still the same
+        return f"_invoke({name!r}{''.join(', ' + a for a in arguments)})"
+
+    def expression_InlinedCallNode(self, node):
+        return self.expression_CallExprNode(node.call)
+
+
+#######################################################################################
+
+
+class ModuleFunctionTranslator(FunctionTranslator):
+    # Writes a function for ModuleCompiler. Functions of a module may log, and
+    # they call each other directly since they can not be redefined.
+
+    def spend(self):
+        # modules run without limits
+        pass
+
+    def record_symbol(self, node, name, is_constant, type_name, python_name):
+        # the symbols report is not part of the output of a module
+        pass
+
+    def call(self, name, arguments):
+        return f"olc_{name}({', '.join(arguments)})"
+
+    def statement_ConsoleLogNode(self, node):
+        parts = []
+        for argument in node.arguments:
+            source, kind = self.expression(argument)
+            if kind == "num":
+                source = f"str({source})"
+            elif kind == "bool":
+                source = f"('true' if {source} else 'false')"
+            parts.append(source)
+        if len(parts) == 1:
+            self.emit(f"_log.append({parts[0]})")
+        else:
+            self.emit(f"_log.append(' '.join(({''.join(p + ', ' for p in parts)})))")
+
+    def statement_CallExprNode(self, node):
+        source, kind = self.expression(node)
+        self.emit(source)
+
+    statement_InlinedCallNode = statement_CallExprNode
+
+
+class ProgramTranslator(ModuleFunctionTranslator):
+    # Writes the statements of a whole program as the function 'program'
+
+    def translate(self):
+        self.function_name = "program"
+        # a return outside of a function is an error
+        self.return_kind = None
+        self.context_name = "<global>"
+        self.scopes.append({})
+        self.statements(self.fn.statements)
+        return "\n".join(["def program():"] + self.lines) + "\n"
+
+    def statement_FunctionNode(self, node):
+        # functions are translated where they are declared, calls can only
+        # reach the functions declared before them
+        if len(self.scopes) != 1:
+            self.unsupported(node)
+        self.compiler.declare(node)
+
+
+#######################################################################################
+
+
+class ModuleCompiler:
+    # Translates a whole program ahead of time into a standalone python module.
+    # The statements go through the same translator used for hot functions,
+    # plus console.log, and the module keeps the log until the program ends.
+    # When the compiled code meets a runtime error the module throws the log
+    # away and runs the embedded source with the interpreter, so the output and
+    # the errors read exactly the same. A program the translator can not handle
+    # gets a module that always runs the interpreter.
+
+    def __init__(self, source_code, file):
+        self.source_code = source_code
+        self.file = file
+        # name -> FunctionNode, for the functions declared so far
+        self.functions = {}
+        self.function_sources = []
+        self.errors_as_string = ""
+        # why the module runs the interpreter, None when the program was compiled
+        self.unsupported = None
+
+    def compile(self):
+        # returns the source of the module, or None when the program has syntax errors
+        olcscript_parser = OLCScriptParser(self.source_code)
+        with contextlib.redirect_stdout(io.StringIO()):
+            ast = olcscript_parser.parse()
+        if len(olcscript_parser.errors) > 0:
+            self.errors_as_string = olcscript_parser.errors_as_string
+            return None
+        global_context = GlobalContext("<global>")
+        interpreter = Interpreter(
+            olcscript_parser.lexer.lexdata, global_context, self.file
+        )
+        ast = Optimizer(interpreter, global_context).optimize(ast)
+        try:
+            program = ProgramTranslator(self, ast).translate()
+        except (UnsupportedFunction, RecursionError) as e:
+            self.unsupported = str(e) or type(e).__name__
+            program = None
+        return self.module_source(program)
+
+    def declare(self, fn):
+        name = fn.name.token.value
+        # a redefinition is a runtime error
+        if name in self.functions:
+            raise UnsupportedFunction(name)
+        self.functions[name] = fn
+        self.function_sources.append(ModuleFunctionTranslator(self, fn).translate())
+
+    def callee(self, name):
+        fn = self.functions.get(name)
+        if fn is None:
+            raise UnsupportedFunction(name)
+        return fn
+
+    def module_source(self, program):
+        lines = [
+            '"""',
+            f"{self.file}, compiled by 'python -m app compile'. Do not edit.",
+            '"""',
+            "",
+            "import sys",
+            "",
+            f"SOURCE_FILE = {self.file!r}",
+            f"SOURCE_HASH = {hashlib.sha256(self.source_code.encode()).hexdigest()!r}",
+            f"SOURCE = {self.source_code!r}",
+            "# where to find the interpreter when the compiled code gives up",
+            f"INTERPRETER_PATH = {os.path.dirname(os.path.abspath(__file__))!r}",
+            "",
+            "",
+            "def interpret():",
+            "    # the interpreter prints the log and the errors itself",
+            "    if INTERPRETER_PATH not in sys.path:",
+            "        sys.path.append(INTERPRETER_PATH)",
+            "    from app import run_source",
+            "",
+            "    return run_source(SOURCE, SOURCE_FILE)",
+            "",
+            "",
+        ]
+        if program is None:
+            lines += [
+                f"# the program is interpreted: {self.unsupported}",
+                "def main():",
+                "    return interpret()",
+            ]
+        else:
+            lines += [
+                "class CompiledFunctionDeopt(Exception):",
+                "    pass",
+                "",
+                "",
+                inspect.getsource(compiled_div),
+                "",
+                inspect.getsource(compiled_mod),
+                "",
+                "_div = compiled_div",
+                "_mod = compiled_mod",
+                "_log = []",
+                "",
+                "",
+            ]
+            for source in self.function_sources + [program]:
+                lines += [source, ""]
+            lines += [
+                "def main():",
+                "    try:",
+                "        program()",
+                "    except Exception:",
+                "        # a runtime error, the interpreter reports it",
+                "        return interpret()",
+                "    if _log:",
+                "        print('\\n'.join(_log))",
+                "    return 0",
+            ]
+        lines += [
+            "",
+            "",
+            'if __name__ == "__main__":',
+            "    sys.exit(main())",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def run_source(source_code, file="file.olc"):
+    # Parses, optimizes and runs a program the way /eval does. The interpreter
+    # prints the log as it runs, returns 1 when the program reported errors.
+    ast, parse_errors = parse_cache.parse(source_code)
+    if parse_errors:
+        print(parse_errors)
+        return 1
+    global_context = GlobalContext("<global>")
+    olcscript_interpreter = Interpreter(
+        source_code, global_context, file, echo=PrintSink()
+    )
+    ast = Optimizer(olcscript_interpreter, global_context).optimize(ast)
+    olcscript_interpreter.visit(ast, global_context)
+    return 1 if len(olcscript_interpreter.errors) > 0 else 0
+
+
+def compile_command(arguments):
+    # python -m app compile [-o DIR] FILE...
+    argument_parser = argparse.ArgumentParser(
+        prog="python -m app compile",
+        description="Compile OLCScript programs into standalone python modules.",
+    )
+    argument_parser.add_argument("files", nargs="+", metavar="FILE")
+    argument_parser.add_argument(
+        "-o",
+        "--output-dir",
+        help="where to write the modules, next to every program by default",
+    )
+    options = argument_parser.parse_args(arguments)
+
+    status = 0
+    for path in options.files:
+        with open(path, encoding="utf-8") as source_file:
+            source_code = source_file.read()
+        compiler = ModuleCompiler(source_code, os.path.basename(path))
+        module_source = compiler.compile()
+        if module_source is None:
+            print(compiler.errors_as_string, file=sys.stderr)
+            status = 1
+            continue
+        # <name>_olc.py, a program can not overwrite app.py
+        module_path = os.path.join(
+            options.output_dir or os.path.dirname(path),
+            f"{os.path.splitext(os.path.basename(path))[0]}_olc.py",
+        )
+        with open(module_path, "w", encoding="utf-8") as module_file:
+            module_file.write(module_source)
+        if compiler.unsupported is not None:
+            print(
+                f"{path}: runs on the interpreter, unsupported {compiler.unsupported}",
+                file=sys.stderr,
+            )
+        print(f"{path} -> {module_path}")
+    return status
+
+
+# ------------------------------------------------------------------------------------
+#                                 PARSE CACHE
+# ------------------------------------------------------------------------------------
+
+# changes along with the interpreter, trees cached by another version are never read
+with open(__file__, "rb") as interpreter_file:
+    INTERPRETER_VERSION = hashlib.sha256(interpreter_file.read()).hexdigest()[:16]
+
+
+def reduce_token(token):
+    # tokens keep a reference to the lexer that made them, it is left out
+    state = vars(token).copy()
+    state.pop("lexer", None)
+    return lex.LexToken, (), state
+
+
+def private_directory(path):
+    # creates the directory readable only by this user, or checks that it is,
+    # so no other local user can plant files in it. Raises OSError otherwise.
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    status = os.lstat(path)
+    if not stat.S_ISDIR(status.st_mode):
+        raise OSError(f"{path} is not a directory")
+    if hasattr(os, "getuid") and status.st_uid != os.getuid():
+        raise OSError(f"{path} belongs to another user")
+    if status.st_mode & 0o077:
+        raise OSError(f"{path} can be used by other users")
+    return path
+
+
+def install_secret(directory):
+    # the key of the directory, made the first time, only this user reads it
+    path = os.path.join(directory, "secret")
+    try:
+        descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(path, "rb") as secret_file:
+            secret = secret_file.read()
+        if len(secret) < 32:
+            raise OSError(f"{path} is not a secret")
+        return secret
+    secret = secrets.token_bytes(32)
+    with os.fdopen(descriptor, "wb") as secret_file:
+        secret_file.write(secret)
+    return secret
+
+
+class TreePickler(pickle.Pickler):
+    # only tokens are reduced differently, every other object is pickled as
+    # usual without calling back into python
+    dispatch_table = {lex.LexToken: reduce_token}
+
+
+class ParseCache:
+    # Keeps the trees built by OLCScriptParser in a directory, one file per
+    # program, named after the interpreter version and the hash of the source.
+    # A file is a short header, an HMAC of the rest and the pickled tree
+    # compressed with zlib. Trees are loaded on demand, a fresh copy for every
+    # run since the interpreter quickens the nodes it visits, and once the
+    # files take more than max_bytes the least recently used ones are removed.
+    #
+    # Unpickling runs code, so the directory has to be private to the user of
+    # the server (see private_directory) and every file is signed with the
+    # secret kept in it, a file that was not written by the cache is never
+    # unpickled. Without a directory the cache is off. The cache never fails a
+    # parse: a directory that can not be used or a broken file is just a miss.
+
+    MAGIC = b"OLCAST2\n"
+
+    def __init__(self, directory=None, max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # the secret of the directory, None until it was checked, False when
+        # it can not be used
+        self.secret = None
+
+    def key(self):
+        if self.secret is None and self.directory is not None:
+            try:
+                self.secret = install_secret(private_directory(self.directory))
+            except OSError as e:
+                log_sink.error(f"the parse cache is off: {e}")
+                self.secret = False
+        return self.secret or None
+
+    def sign(self, payload):
+        return hmac.new(self.key(), payload, hashlib.sha256).digest()
+
+    def path(self, source_code):
+        key = hashlib.sha256(source_code.encode()).hexdigest()
+        return os.path.join(self.directory, f"{INTERPRETER_VERSION}-{key}.ast")
+
+    def parse(self, source_code, front_end=None):
+        # returns the tree and the syntax errors report, only trees without
+        # errors are cached. Both front ends build the same trees.
+        ast = self.load(source_code)
+        if ast is not None:
+            return ast, ""
+        # a new version of a program reuses the declarations it did not change
+        ast, parse_errors = declaration_cache.parse(source_code, front_end)
+        if parse_errors:
+            return ast, parse_errors
+        self.store(source_code, ast)
+        return ast, ""
+
+    def load(self, source_code):
+        if self.key() is None:
+            return None
+        path = self.path(source_code)
+        try:
+            with open(path, "rb") as cache_file:
+                data = cache_file.read()
+            # the modification time tells the least recently used files
+            os.utime(path)
+        except OSError:
+            return None
+        try:
+            if not data.startswith(self.MAGIC):
+                raise ValueError(path)
+            signature_end = len(self.MAGIC) + hashlib.sha256().digest_size
+            signature = data[len(self.MAGIC) : signature_end]
+            payload = data[signature_end:]
+            if not hmac.compare_digest(signature, self.sign(payload)):
+                raise ValueError(path)
+            return pickle.loads(zlib.decompress(payload))
+        except Exception:
+            self.remove(path)
+            return None
+
+    def store(self, source_code, ast):
+        if self.key() is None:
+            return
+        tree = io.BytesIO()
+        try:
+            TreePickler(tree, pickle.HIGHEST_PROTOCOL).dump(ast)
+        except (pickle.PicklingError, RecursionError):
+            # very deep trees are parsed every time
+            return
+        payload = zlib.compress(tree.getvalue())
+        data = self.MAGIC + self.sign(payload) + payload
+        path = self.path(source_code)
+        try:
+            # other workers only ever see complete files
+            temporary_path = f"{path}.{os.getpid()}.tmp"
+            with open(temporary_path, "wb") as cache_file:
+                cache_file.write(data)
+            os.replace(temporary_path, path)
+        except OSError:
+            return
+        self.evict()
+
+    def evict(self):
+        entries = []
+        try:
+            with os.scandir(self.directory) as files:
+                for entry in files:
+                    if entry.name.endswith(".ast"):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError:
+            return
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self.remove(path)
+            total -= size
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class DeclarationCache:
+    # Parses a program one top level declaration at a time and keeps the tree of
+    # every declaration in memory, so a program edited one function at a time
+    # only parses the declarations that changed. A declaration is found by its
+    # text and the column it starts at, its tree is kept pickled along with the
+    # line it was parsed at, and moved to the line it is found at when used.
+    #
+    # The source is cut without parsing: a declaration ends with a semicolon
+    # outside any brackets, or with the closing brace of the block of an
+    # interface, function, if (unless an else follows), switch, while or for.
+    # Strings, chars and comments are stepped over like the lexer does. Any
+    # declaration with a syntax error makes the whole program be parsed again,
+    # the errors are the same as without the cache.
+    #
+    # The least recently used trees are dropped once there are more than
+    # max_entries of them or they take more than max_bytes. Declarations longer
+    # than MAX_DECLARATION_LENGTH characters are parsed every time.
+
+    MAX_ENTRIES = 4096
+    MAX_BYTES = 64 * 1024 * 1024
+    MAX_DECLARATION_LENGTH = 64 * 1024
+
+    SCAN_REGEX = re.compile(
+        r"""
+        "(?:\\.|[^"\\])*"
+        | '(?:\\.|[^'\\])*'
+        | //.*
+        | /\*[^*]*\*+(?:[^/*][^*]*\*+)*/
+        | [;{}()\[\]]
+        """,
+        re.VERBOSE,
+    )
+    BLOCK_DECLARATION_REGEX = re.compile(
+        r"(?:interface|function|if|switch|while|for)\b"
+    )
+    ELSE_REGEX = re.compile(PrattParser.SKIP_PATTERN + r"else\b")
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        self.max_entries = max_entries or DeclarationCache.MAX_ENTRIES
+        self.max_bytes = max_bytes or DeclarationCache.MAX_BYTES
+        # key: (line, payload), oldest first
+        self.entries = {}
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def parse(self, source_code, front_end=None):
+        # returns the tree and the syntax errors report, like ParseCache.parse
+        chunks = self.split(source_code)
+        if not chunks:
+            return self.parse_source(source_code, front_end)
+        declarations = []
+        missing = []
+        for start, end, line, column, newlines in chunks:
+            text = source_code[start:end]
+            key = (column, hashlib.sha256(text.encode()).digest())
+            declaration = self.load(key, line)
+            if declaration is None:
+                missing.append((len(declarations), key, text, line, column, newlines))
+            declarations.append(declaration)
+        if missing:
+            # the new declarations are parsed together, each one at its column
+            # and, when it does not share a line with the one before, at its line
+            parts = []
+            first_lines = []
+            current_line = 1
+            for _, _, text, line, column, newlines in missing:
+                first_line = max(line, current_line + 1 if parts else 1)
+                parts.append("\n" * (first_line - current_line) + " " * column + text)
+                first_lines.append(first_line)
+                current_line = first_line + newlines
+            tree, parse_errors = self.parse_source("".join(parts), front_end)
+            if parse_errors or len(tree.statements) != len(missing):
+                return self.parse_source(source_code, front_end)
+            for declaration, first_line, (index, key, text, line, _, _) in zip(
+                tree.statements, first_lines, missing
+            ):
+                self.rebase(declaration, line - first_line)
+                if len(text) <= DeclarationCache.MAX_DECLARATION_LENGTH:
+                    self.store(key, line, declaration)
+                declarations[index] = declaration
+        return ProgramNode(declarations), ""
+
+    def parse_source(self, source_code, front_end):
+        olcscript_parser = OLCScriptParser(source_code, front_end=front_end)
+        with contextlib.redirect_stdout(io.StringIO()):
+            ast = olcscript_parser.parse()
+        return ast, olcscript_parser.errors_as_string
+
+    def split(self, source_code):
+        # the start, end, line, column and newlines counted by the lexer of
+        # every declaration
+        chunks = []
+        skip = PrattParser.SKIP_REGEX.match
+        count = source_code.count
+        start = skip(source_code).end()
+        line = 1 + count("\n", 0, start)
+        line_start = source_code.rfind("\n", 0, start) + 1
+        block_declaration = self.BLOCK_DECLARATION_REGEX.match(source_code, start)
+        depth = 0
+        # the lexer does not count the newlines inside strings and chars
+        uncounted = 0
+        for m in self.SCAN_REGEX.finditer(source_code, start):
+            end = m.end()
+            if end - m.start() != 1:
+                # a string, char or comment
+                if source_code[m.start()] in "\"'":
+                    uncounted += count("\n", m.start(), end)
+                continue
+            bracket = source_code[m.start()]
+            if bracket in "({[":
+                depth += 1
+                continue
+            if bracket in ")]":
+                depth -= 1
+                continue
+            if bracket == "}":
+                depth -= 1
+                if (
+                    depth != 0
+                    or not block_declaration
+                    or self.ELSE_REGEX.match(source_code, end)
+                ):
+                    continue
+            elif depth != 0:
+                continue
+            newlines = count("\n", start, end) - uncounted
+            chunks.append((start, end, line, start - line_start, newlines))
+            uncounted = 0
+            next_start = skip(source_code, end).end()
+            line += newlines + count("\n", end, next_start)
+            last_newline = source_code.rfind("\n", start, next_start)
+            if last_newline != -1:
+                line_start = last_newline + 1
+            start = next_start
+            block_declaration = self.BLOCK_DECLARATION_REGEX.match(source_code, start)
+        if start < len(source_code):
+            # an unfinished declaration, its syntax error is reported
+            newlines = count("\n", start) - uncounted
+            chunks.append((start, len(source_code), line, start - line_start, newlines))
+        return chunks
+
+    def load(self, key, line):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return None
+            # the most recently used entries are the last ones
+            self.entries[key] = entry
+        parsed_line, payload = entry
+        tree = pickle.loads(payload)
+        if parsed_line != line:
+            self.rebase(tree, line - parsed_line)
+        return tree
+
+    def store(self, key, line, tree):
+        payload = io.BytesIO()
+        try:
+            TreePickler(payload, pickle.HIGHEST_PROTOCOL).dump(tree)
+        except (pickle.PicklingError, RecursionError):
+            return
+        payload = payload.getvalue()
+        if self.entry_size(key, payload) > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= self.entry_size(key, previous[1])
+            self.entries[key] = (line, payload)
+            self.size += self.entry_size(key, payload)
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                oldest = next(iter(self.entries))
+                self.size -= self.entry_size(oldest, self.entries.pop(oldest)[1])
+
+    def entry_size(self, key, payload):
+        # the column and the digest of the key, and the pickled tree
+        return 8 + len(key[1]) + len(payload)
+
+    def rebase(self, tree, lines):
+        # moves every node and token of a tree down by a number of lines
+        if lines == 0:
+            return
+        seen = set()
+        pending = [tree]
+        while pending:
+            item = pending.pop()
+            if isinstance(item, list):
+                pending.extend(item)
+                continue
+            if id(item) in seen:
+                continue
+            seen.add(id(item))
+            if isinstance(item, lex.LexToken):
+                item.lineno += lines
+            elif hasattr(item, "__dict__") and not isinstance(item, (type, Enum)):
+                attributes = vars(item)
+                if isinstance(attributes.get("line"), int):
+                    item.line += lines
+                pending.extend(attributes.values())
+
+
+# shared by every request of the process, and by every process using the
+# directory, off unless OLCSCRIPT_PARSE_CACHE names one
+parse_cache = ParseCache(os.environ.get("OLCSCRIPT_PARSE_CACHE"))
+# the declarations of the programs parsed by this process
+declaration_cache = DeclarationCache()
+
+
+# ------------------------------------------------------------------------------------
+#                                 WORKER POOL
+# ------------------------------------------------------------------------------------
+
+
+class WorkerFailure(Exception):
+    # A worker did not answer a job, the message is the response to the request
+    pass
+
+
+def worker_main(connection):
+    # The body of a worker process: runs one program to load the grammar
+    # tables, the types and the compiler, says it is ready with its memory use,
+    # and answers jobs until the pipe is closed. A job comes with the budget to
+    # run it with, or None for the one of /eval. A job asking for its output
+    # gets ("output", lines) messages while it runs, every job ends with
+    # ("done", response, memory).
+    with contextlib.redirect_stdout(io.StringIO()):
+        run_program({"payload": WorkerPool.WARM_UP_PROGRAM})
+    connection.send(ExecutionBudget.memory_in_use())
+    while True:
+        try:
+            request_dict, sends_output, budget = connection.recv()
+        except EOFError:
+            return
+        output = None
+        if sends_output:
+            output = LineBatcher(lambda lines: connection.send(("output", lines)))
+        try:
+            response = run_program(
+                request_dict, budget=budget, output=output.write if output else None
+            )
+            if output:
+                output.flush()
+        except Exception:
+            error = traceback.format_exc()
+            log_sink.error(error)
+            response = {"result": error, "errs": error}
+        connection.send(("done", response, ExecutionBudget.memory_in_use()))
+
+
+class LineBatcher:
+    # Gives console lines to send(lines) in batches: once they are over
+    # max_size characters, or interval seconds after the last batch was sent
+    def __init__(self, send, max_size=16 * 1024, interval=0.1):
+        self.send = send
+        self.max_size = max_size
+        self.interval = interval
+        self.lines = []
+        self.size = 0
+        self.last_send = time.monotonic()
+
+    def write(self, line):
+        self.lines.append(line)
+        self.size += len(line) + 1
+        if (
+            self.size >= self.max_size
+            or time.monotonic() - self.last_send >= self.interval
+        ):
+            self.flush()
+
+    def flush(self):
+        if self.lines:
+            lines = self.lines
+            self.lines = []
+            self.size = 0
+            self.send(lines)
+        self.last_send = time.monotonic()
+
+
+class Worker:
+    # A worker process and the pipe to it, see WorkerPool
+    def __init__(self, context):
+        self.connection, worker_connection = context.Pipe()
+        self.process = context.Process(
+            target=worker_main, args=(worker_connection,), daemon=True
+        )
+        self.process.start()
+        worker_connection.close()
+        self.is_ready = False
+        self.jobs = 0
+        self.memory = None
+
+    def wait_ready(self, timeout):
+        if self.is_ready:
+            return
+        if not self.connection.poll(timeout):
+            raise WorkerFailure(f"the worker did not start in {timeout:g} seconds")
+        self.memory = self.connection.recv()
+        self.is_ready = True
+
+    # how often a job that can be cancelled is looked at
+    POLL_INTERVAL = 0.25
+
+    def run(
+        self, request_dict, timeout, on_output=None, is_cancelled=None, budget=None
+    ):
+        self.connection.send((request_dict, on_output is not None, budget))
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise WorkerFailure(
+                    f"the program was stopped after {timeout:g} seconds"
+                )
+            if is_cancelled is not None:
+                remaining = min(remaining, Worker.POLL_INTERVAL)
+            if self.connection.poll(remaining):
+                message = self.connection.recv()
+                if message[0] == "done":
+                    _, response, self.memory = message
+                    self.jobs += 1
+                    return response
+                on_output(message[1])
+            if is_cancelled is not None and is_cancelled():
+                # the worker is stopped with the program
+                raise WorkerFailure("the program was cancelled")
+
+    def stop(self):
+        self.connection.close()
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+
+
+class WorkerPool:
+    # Runs the /eval programs in worker processes, so CPU bound programs use
+    # every core and do not block the server. Workers start warm: they load
+    # everything a program needs before taking jobs. A request takes an idle
+    # worker, sends it the request over a pipe and waits for the response. A
+    # worker that crashes or runs a job longer than job_timeout is killed and
+    # replaced, the request gets an error. Workers are also replaced after
+    # max_jobs jobs, or once their resident memory is above max_memory.
+    #
+    # New workers come from a fork server that has this module loaded, which
+    # is safe from a threaded server, or are spawned where there is none.
+
+    SIZE = os.cpu_count() or 1
+    MAX_JOBS = 500
+    MAX_MEMORY = 1024 * 1024 * 1024
+    # programs stop themselves at their time budget, this is only for the stuck ones
+    JOB_TIMEOUT = ExecutionBudget.TIMEOUT_MS / 1000 + 5
+    START_TIMEOUT = 60
+
+    WARM_UP_PROGRAM = """
+function warm_up(n: number): number {
+    var total: number = 0;
+    for (var i: number = 0; i < n; i++) {
+        total = total + i % 3;
+    }
+    return total;
+}
+for (var i: number = 0; i < 60; i++) {
+    warm_up(i);
+}
+console.log("ready" + warm_up(10));
+"""
+
+    def __init__(self, size=None, max_jobs=None, max_memory=None, job_timeout=None):
+        self.size = size or WorkerPool.SIZE
+        self.max_jobs = max_jobs or WorkerPool.MAX_JOBS
+        self.max_memory = max_memory or WorkerPool.MAX_MEMORY
+        self.job_timeout = job_timeout or WorkerPool.JOB_TIMEOUT
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            self.context = multiprocessing.get_context("forkserver")
+            self.context.set_forkserver_preload([__name__])
+        else:
+            self.context = multiprocessing.get_context("spawn")
+        self.idle = queue.Queue()
+        for _ in range(self.size):
+            self.idle.put(Worker(self.context))
+        atexit.register(self.close)
+
+    def run(
+        self, request_dict, on_output=None, is_cancelled=None, budget=None, timeout=None
+    ):
+        # returns the response of the request, like run_program. The console
+        # lines go to on_output(lines) while it runs when given, and the run
+        # stops once is_cancelled() returns True. A budget and a timeout other
+        # than those of /eval are for the programs allowed to run longer.
+        worker = self.idle.get()
+        if not worker.process.is_alive():
+            # it died while idle, the request is not to blame
+            worker = self.replace(worker)
+        is_healthy = False
+        try:
+            worker.wait_ready(WorkerPool.START_TIMEOUT)
+            response = worker.run(
+                request_dict,
+                timeout or self.job_timeout,
+                on_output,
+                is_cancelled,
+                budget,
+            )
+            is_healthy = (
+                worker.jobs < self.max_jobs and (worker.memory or 0) <= self.max_memory
+            )
+        except WorkerFailure as failure:
+            response = {"result": str(failure), "errs": str(failure)}
+        except (EOFError, OSError):
+            message = "the worker running the program crashed"
+            response = {"result": message, "errs": message}
+        finally:
+            # broken and worn out workers are replaced
+            self.idle.put(worker if is_healthy else self.replace(worker))
+        return response
+
+    def replace(self, worker):
+        worker.stop()
+        return Worker(self.context)
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().stop()
+            except queue.Empty:
+                return
+
+
+# the pool /eval runs programs in, None runs them in the request thread
+worker_pool = None
+
+
+def start_worker_pool(size=None):
+    # starts the pool for /eval, servers call it once they are ready to fork
+    global worker_pool
+    if worker_pool is None:
+        worker_pool = WorkerPool(size)
+    return worker_pool
+
+
+# ------------------------------------------------------------------------------------
+#                                 RESPONSE CACHE
+# ------------------------------------------------------------------------------------
+
+
+class ResponseCache:
+    # Keeps the responses of /eval in memory by the hash of the request, the
+    # source with every option, as a program always prints the same output.
+    # Concurrent identical requests are coalesced: the first one runs the
+    # program and the others wait for its response. The least recently used
+    # responses are dropped once there are more than max_entries of them or
+    # their text is over max_bytes, and after ttl seconds when there is one.
+    #
+    # Not everything is deterministic. The response of a run that called
+    # Math.random() without a seed says "random", it is neither kept nor shared:
+    # the waiting requests run the program again each. Responses stopped by the
+    # time or memory limits, which depend on the machine, are shared with the
+    # waiting requests but not kept. Only complete runs are kept, the failed
+    # ones have no symbols.
+
+    MAX_ENTRIES = 1024
+    MAX_BYTES = 64 * 1024 * 1024
+    TTL = None
+    MACHINE_DEPENDENT_ERRORS = ("OLC9002", "OLC9003")
+
+    def __init__(self, max_entries=None, max_bytes=None, ttl=None):
+        self.max_entries = max_entries or ResponseCache.MAX_ENTRIES
+        self.max_bytes = max_bytes or ResponseCache.MAX_BYTES
+        self.ttl = ttl or ResponseCache.TTL
+        # key: (expiry time or None, size, response), oldest first
+        self.entries = {}
+        self.size = 0
+        # key: the run in progress
+        self.flights = {}
+        self.lock = threading.Lock()
+
+    def run(self, request_dict, execute):
+        # returns the response of the request, from the cache, from the
+        # identical request being run, or from execute(request_dict)
+        key = self.key(request_dict)
+        with self.lock:
+            response = self.load(key)
+            if response is not None:
+                return response
+            flight = self.flights.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = self.flights[key] = Flight()
+        if not is_leader:
+            response = flight.wait()
+            if response is None:
+                return execute(request_dict)
+            return response
+        try:
+            response = execute(request_dict)
+        except BaseException as e:
+            flight.error = e
+            raise
+        else:
+            if not self.is_deterministic(response):
+                return response
+            flight.response = response
+            if self.is_cacheable(response):
+                with self.lock:
+                    self.store(key, response)
+            return response
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+
+    def key(self, request_dict):
+        text = json.dumps(request_dict, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(text.encode()).digest()
+
+    def is_deterministic(self, response):
+        return not response.get("random")
+
+    def is_cacheable(self, response):
+        return "symbols" in response and not any(
+            code in response["errs"] for code in self.MACHINE_DEPENDENT_ERRORS
+        )
+
+    def load(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return None
+        expiry, _, response = entry
+        if expiry is not None and expiry <= time.monotonic():
+            self.size -= entry[1]
+            return None
+        # the most recently used entries are the last ones
+        self.entries[key] = entry
+        return response
+
+    def store(self, key, response):
+        size = sum(len(value) for value in response.values())
+        if size > self.max_bytes:
+            return
+        expiry = time.monotonic() + self.ttl if self.ttl else None
+        if key in self.entries:
+            self.size -= self.entries.pop(key)[1]
+        self.entries[key] = (expiry, size, response)
+        self.size += size
+        while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+            oldest = next(iter(self.entries))
+            self.size -= self.entries.pop(oldest)[1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+class Flight:
+    # A run of ResponseCache in progress, and the requests waiting for it. Its
+    # response stays None when the run is not deterministic.
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.response
+
+
+# the responses of this server process
+response_cache = ResponseCache()
+
+
+# ------------------------------------------------------------------------------------
+#                                 CONSOLE STREAM
+# ------------------------------------------------------------------------------------
+
+
+class ConsoleStream:
+    # Carries the console lines of a program run from a thread, in the worker
+    # pool when there is one, to the request streaming them, see /eval/stream. Lines are sent in chunks of about
+    # CHUNK_SIZE characters, or every FLUSH_INTERVAL seconds if fewer were
+    # written. At most MAX_CHUNKS chunks wait for the client, then the program
+    # waits for it too, so a chatty program does not fill the memory of the
+    # server. The run ends with the response of run_program, its log is empty.
+
+    CHUNK_SIZE = 16 * 1024
+    MAX_CHUNKS = 16
+    FLUSH_INTERVAL = 0.1
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.chunks = queue.Queue(ConsoleStream.MAX_CHUNKS)
+        # the lines of the chunk being filled
+        self.lines = []
+        self.size = 0
+        self.lock = threading.Lock()
+        self.is_closed = False
+        self.response = None
+
+    def run(self, request_dict):
+        try:
+            if worker_pool is not None:
+                self.response = worker_pool.run(
+                    request_dict, self.write_lines, lambda: self.is_closed
+                )
+            else:
+                self.response = run_program(
+                    request_dict, budget=self.budget, output=self.write
+                )
+        except Exception:
+            error = traceback.format_exc()
+            log_sink.error(error)
+            self.response = {"result": error, "errs": error}
+        # the syntax errors and failures are only in the result
+        if self.response["result"]:
+            self.write(self.response["result"])
+        with self.lock:
+            self.put(self.take())
+            self.put(None)
+
+    def write(self, line):
+        with self.lock:
+            self.lines.append(line)
+            self.size += len(line) + 1
+            if self.size >= ConsoleStream.CHUNK_SIZE:
+                self.put(self.take())
+
+    def write_lines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def take(self):
+        lines = self.lines
+        self.lines = []
+        self.size = 0
+        return lines
+
+    def put(self, chunk):
+        # called with the lock held, the reader only takes it when the queue
+        # is empty, so the chunks stay in order. Once the client went away the
+        # lines are dropped, and the program stops at its next step.
+        while not self.is_closed:
+            try:
+                self.chunks.put(chunk, timeout=ConsoleStream.FLUSH_INTERVAL)
+                return
+            except queue.Full:
+                pass
+
+    def read(self):
+        # the next lines for the client, maybe none, or None once the run ended
+        try:
+            return self.chunks.get(timeout=ConsoleStream.FLUSH_INTERVAL)
+        except queue.Empty:
+            with self.lock:
+                try:
+                    return self.chunks.get_nowait()
+                except queue.Empty:
+                    return self.take()
+
+    def close(self):
+        if not self.is_closed:
+            self.is_closed = True
+            self.budget.cancel("the client of the program went away")
+
+
+# ------------------------------------------------------------------------------------
+#                                 JOBS
+# ------------------------------------------------------------------------------------
+
+
+class JobStore:
+    # Keeps the jobs of /jobs in a SQLite database, so every server process
+    # can answer about the jobs of the others, and their results outlive a
+    # restart. A job is queued, running, then done, failed or cancelled. Its
+    # output is the console so far, a ConsoleLog, and its response the one of
+    # /eval. Jobs are removed ttl seconds after they last changed. A
+    # connection is opened for every operation, which is what makes it safe
+    # from any thread.
+    #
+    # A job is run by the process that made it, its owner. The first time a
+    # process uses the store the unfinished jobs of owners that are gone,
+    # stopped or restarted, are marked failed since nothing will run them.
+    # The database is kept in a private directory, see private_directory.
+
+    TTL = 24 * 60 * 60
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            request TEXT NOT NULL,
+            output TEXT NOT NULL DEFAULT '',
+            response TEXT,
+            owner INTEGER NOT NULL,
+            created REAL NOT NULL,
+            updated REAL NOT NULL
+        )
+    """
+
+    def __init__(self, path, ttl=None):
+        self.path = path
+        self.ttl = ttl or JobStore.TTL
+        self.is_ready = False
+        self.lock = threading.Lock()
+
+    def connect(self):
+        with self.lock:
+            if not self.is_ready:
+                private_directory(os.path.dirname(os.path.abspath(self.path)))
+                with contextlib.closing(self.open()) as connection:
+                    # readers do not wait for the writers
+                    connection.execute("PRAGMA journal_mode=WAL")
+                    connection.execute(self.SCHEMA)
+                    self.fail_orphans(connection)
+                self.is_ready = True
+        return contextlib.closing(self.open())
+
+    def open(self):
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def fail_orphans(self, connection):
+        message = "the server running the job stopped before it ended"
+        response = json.dumps({"result": message, "errs": message})
+        owners = connection.execute(
+            "SELECT DISTINCT owner FROM jobs WHERE status IN ('queued', 'running')"
+        ).fetchall()
+        for (owner,) in owners:
+            # a process with the pid of this one is an earlier process
+            if owner != os.getpid() and process_is_alive(owner):
+                continue
+            connection.execute(
+                "UPDATE jobs SET status = 'failed', response = ?, updated = ?"
+                " WHERE owner = ? AND status IN ('queued', 'running')",
+                (response, time.time(), owner),
+            )
+
+    def create(self, request_dict):
+        job_id = secrets.token_hex(16)
+        now = time.time()
+        with self.connect() as connection:
+            connection.execute("DELETE FROM jobs WHERE updated < ?", (now - self.ttl,))
+            connection.execute(
+                "INSERT INTO jobs (id, status, request, owner, created, updated)"
+                " VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, json.dumps(request_dict), os.getpid(), now, now),
+            )
+        return job_id
+
+    def get(self, job_id):
+        with self.connect() as connection:
+            row = connection.execute(
+                "SELECT id, status, output, response, created, updated"
+                " FROM jobs WHERE id = ? AND updated >= ?",
+                (job_id, time.time() - self.ttl),
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["response"] = json.loads(job["response"]) if job["response"] else None
+        return job
+
+    def start(self, job_id):
+        # False when the job was cancelled before it started
+        return self.update(job_id, "status = 'running'", "status = 'queued'", ())
+
+    def save_output(self, job_id, output):
+        self.update(job_id, "output = ?", "status = 'running'", (output,))
+
+    def finish(self, job_id, status, output, response):
+        # a cancelled job keeps its status
+        self.update(
+            job_id,
+            "status = CASE status WHEN 'running' THEN ? ELSE status END,"
+            " output = ?, response = ?",
+            "status IN ('running', 'cancelled')",
+            (status, output, json.dumps(response)),
+        )
+
+    def cancel(self, job_id):
+        return self.update(
+            job_id, "status = 'cancelled'", "status IN ('queued', 'running')", ()
+        )
+
+    def is_cancelled(self, job_id):
+        with self.connect() as connection:
+            row = connection.execute(
+                "SELECT status FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return row is None or row["status"] == "cancelled"
+
+    def update(self, job_id, assignments, condition, values):
+        with self.connect() as connection:
+            cursor = connection.execute(
+                f"UPDATE jobs SET {assignments}, updated = ?"
+                f" WHERE id = ? AND {condition}",
+                (*values, time.time(), job_id),
+            )
+        return cursor.rowcount == 1
+
+
+class Job:
+    # Runs a job of the JobStore in this process: in the worker pool when
+    # there is one, or on the thread of the job. Its output is saved every
+    # SAVE_INTERVAL seconds while it runs, and a thread looks at the store
+    # every CANCEL_INTERVAL seconds to stop the program once it is cancelled.
+    # Jobs are for the programs too long for /eval, they get MAX_STEPS steps
+    # and TIMEOUT_MS milliseconds, which a request can only lower.
+
+    SAVE_INTERVAL = 0.5
+    CANCEL_INTERVAL = 0.5
+    MAX_STEPS = 5_000_000_000
+    TIMEOUT_MS = 15 * 60 * 1000
+    # the worker running a job is killed this long after it started
+    WORKER_TIMEOUT = TIMEOUT_MS / 1000 + 5
+
+    def __init__(self, job_id, request_dict):
+        self.id = job_id
+        self.request_dict = request_dict
+        self.budget = ExecutionBudget.for_request(
+            request_dict, max_steps=Job.MAX_STEPS, timeout_ms=Job.TIMEOUT_MS
+        )
+        self.output = ConsoleLog()
+        self.next_save = 0
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+
+    def run(self):
+        # jobs take their turn on the workers like the items of batches
+        try:
+            with admission_control.admit(background=True):
+                if job_store.start(self.id):
+                    self.execute()
+        finally:
+            release_job()
+
+    def execute(self):
+        threading.Thread(target=self.watch, daemon=True).start()
+        status = "done"
+        try:
+            if worker_pool is not None:
+                response = worker_pool.run(
+                    self.request_dict,
+                    self.write,
+                    self.cancelled.is_set,
+                    budget=self.budget,
+                    timeout=Job.WORKER_TIMEOUT,
+                )
+            else:
+                output = LineBatcher(self.write)
+                response = run_program(
+                    self.request_dict, budget=self.budget, output=output.write
+                )
+                output.flush()
+        except Exception:
+            error = traceback.format_exc()
+            log_sink.error(error)
+            response = {"result": error, "errs": error}
+            status = "failed"
+        finally:
+            self.done.set()
+        # the syntax errors and failures are only in the result
+        if response["result"]:
+            self.output.append(response["result"])
+        job_store.finish(self.id, status, self.output.as_string(), response)
+
+    def write(self, lines):
+        for line in lines:
+            self.output.append(line)
+        if time.monotonic() >= self.next_save:
+            self.next_save = time.monotonic() + Job.SAVE_INTERVAL
+            job_store.save_output(self.id, self.output.as_string())
+
+    def watch(self):
+        while not self.done.wait(Job.CANCEL_INTERVAL):
+            if job_store.is_cancelled(self.id):
+                self.cancelled.set()
+                self.budget.cancel("the job was cancelled")
+                return
+
+
+def process_is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# the most jobs of a process that can be queued or running
+MAX_PENDING_JOBS = 100
+
+
+def submit_job(request_dict):
+    # stores the job and returns its id. Jobs run for long, they take at most
+    # half of the places of admission control, so /eval keeps the others, and
+    # up to MAX_PENDING_JOBS more wait
+    global job_executor, pending_jobs
+    with job_executor_lock:
+        if pending_jobs >= MAX_PENDING_JOBS:
+            retry_after = math.ceil(
+                admission_control.run_time * pending_jobs / admission_control.limit()
+            )
+            raise Overloaded(
+                "the server is busy, too many jobs are waiting", max(1, retry_after)
+            )
+        pending_jobs += 1
+        if job_executor is None:
+            job_executor = concurrent.futures.ThreadPoolExecutor(
+                max(1, admission_control.limit() // 2)
+            )
+    try:
+        job_id = job_store.create(request_dict)
+    except BaseException:
+        release_job()
+        raise
+    job_executor.submit(Job(job_id, request_dict).run)
+    return job_id
+
+
+def release_job():
+    global pending_jobs
+    with job_executor_lock:
+        pending_jobs -= 1
+
+
+# shared by every server process using the file, OLCSCRIPT_JOBS moves it
+job_store = JobStore(
+    os.environ.get("OLCSCRIPT_JOBS")
+    or os.path.join(os.path.expanduser("~"), ".cache", "olcscript", "jobs.sqlite3")
+)
+job_executor = None
+job_executor_lock = threading.Lock()
+pending_jobs = 0
+
+
+# ------------------------------------------------------------------------------------
+#                                 ADMISSION CONTROL
+# ------------------------------------------------------------------------------------
+
+
+class Overloaded(Exception):
+    # Raised by AdmissionControl.acquire, with the message and the seconds the
+    # client should wait before trying again
+    pass
+
+
+class AdmissionControl:
+    # Lets at most max_running programs run at once, as many as there are
+    # workers by default or MAX_RUNNING_THREADS without a pool, so nothing
+    # waits unseen for a worker. Up to max_queued more /eval and /eval/stream
+    # requests wait for their turn for queue_timeout seconds at most. A
+    # request that finds the queue full, or waits longer, is rejected at once
+    # with a 503 and a Retry-After that grows with the queue, instead of
+    # waiting until its client gives up. The counters are served by /metrics.
+    #
+    # Background programs, the items of batches and the jobs, take the same
+    # places but wait as long as it takes, outside the queue, and only start
+    # when no request is waiting. Their own thread pools bound how many wait.
+
+    # programs running at once when there is no worker pool, on threads
+    MAX_RUNNING_THREADS = 4
+    MAX_QUEUED = 64
+    QUEUE_TIMEOUT = 5.0
+
+    def __init__(self, max_running=None, max_queued=None, queue_timeout=None):
+        self.max_running = max_running
+        self.max_queued = max_queued or AdmissionControl.MAX_QUEUED
+        self.queue_timeout = queue_timeout or AdmissionControl.QUEUE_TIMEOUT
+        self.condition = threading.Condition()
+        self.running = 0
+        self.waiting = 0
+        self.background_waiting = 0
+        # a moving average of how long programs hold their place
+        self.run_time = 0.1
+        self.counters = {
+            "admitted": 0,
+            "admitted_background": 0,
+            "queued": 0,
+            "rejected_queue_full": 0,
+            "rejected_queue_timeout": 0,
+            "too_long": 0,
+        }
+        self.wait_time = 0.0
+
+    def limit(self):
+        if self.max_running is not None:
+            return self.max_running
+        if worker_pool is not None:
+            return worker_pool.size
+        return AdmissionControl.MAX_RUNNING_THREADS
+
+    @contextlib.contextmanager
+    def admit(self, background=False):
+        started = self.acquire(background)
+        try:
+            yield
+        finally:
+            self.release(started)
+
+    def acquire(self, background=False):
+        # returns when the program can run, the time it started
+        with self.condition:
+            if background:
+                return self.acquire_background()
+            limit = self.limit()
+            if self.running < limit and self.waiting == 0:
+                return self.start(0.0)
+            if self.waiting >= self.max_queued:
+                self.counters["rejected_queue_full"] += 1
+                raise Overloaded(
+                    "the server is busy, too many programs are waiting",
+                    self.retry_after(),
+                )
+            self.counters["queued"] += 1
+            self.waiting += 1
+            arrived = time.monotonic()
+            deadline = arrived + self.queue_timeout
+            try:
+                while self.running >= self.limit():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.counters["rejected_queue_timeout"] += 1
+                        raise Overloaded(
+                            "the server is busy, the program waited too long to run",
+                            self.retry_after(),
+                        )
+                    self.condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+            return self.start(time.monotonic() - arrived)
+
+    def acquire_background(self):
+        # called with the condition held
+        self.background_waiting += 1
+        arrived = time.monotonic()
+        try:
+            while self.running >= self.limit() or self.waiting > 0:
+                self.condition.wait()
+        finally:
+            self.background_waiting -= 1
+        self.counters["admitted_background"] += 1
+        return self.start(time.monotonic() - arrived)
+
+    def start(self, waited):
+        self.running += 1
+        self.counters["admitted"] += 1
+        self.wait_time += waited
+        return time.monotonic()
+
+    def release(self, started=None):
+        with self.condition:
+            self.running -= 1
+            if started is not None:
+                self.run_time += (time.monotonic() - started - self.run_time) / 8
+            # requests and background programs wait for different things
+            self.condition.notify_all()
+
+    def retry_after(self):
+        # seconds for the programs ahead to be done, at least one
+        return max(1, math.ceil(self.run_time * (self.waiting + 1) / self.limit()))
+
+    def count(self, counter):
+        with self.condition:
+            self.counters[counter] += 1
+
+    def metrics(self):
+        with self.condition:
+            return {
+                "running": self.running,
+                "waiting": self.waiting,
+                "background_waiting": self.background_waiting,
+                "max_running": self.limit(),
+                "max_queued": self.max_queued,
+                "queue_timeout": self.queue_timeout,
+                "average_run_time": round(self.run_time, 3),
+                "total_wait_time": round(self.wait_time, 3),
+                **self.counters,
+            }
+
+
+# in front of the programs run by this server process, OLCSCRIPT_MAX_RUNNING
+# sets how many run at once
+admission_control = AdmissionControl(
+    int(os.environ["OLCSCRIPT_MAX_RUNNING"])
+    if os.environ.get("OLCSCRIPT_MAX_RUNNING")
+    else None
+)
+
+
 # ------------------------------------------------------------------- #
 #                             MAIN                                    #
 # ------------------------------------------------------------------- #
 
 if __name__ == "__main__":
+    if sys.argv[1:2] == ["compile"]:
+        sys.exit(compile_command(sys.argv[2:]))
+    start_worker_pool()
     app.run()
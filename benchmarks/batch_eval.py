@@ -0,0 +1,67 @@
+"""
+Runs a set of different programs, like an autograder checking submissions.
+
+Times one /eval request per program against a single /eval/batch request
+with all of them, both with a WorkerPool of one worker per core.
+
+    python benchmarks/batch_eval.py [programs]
+"""
+
+import os
+import sys
+import time
+import itertools
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import app
+
+from worker_pool import PROGRAM
+
+SUBMISSION_NUMBERS = itertools.count()
+
+
+def submissions(programs):
+    # a different comment on every program, the responses are not cached
+    return [
+        f"// submission {next(SUBMISSION_NUMBERS)}\n{PROGRAM}" for _ in range(programs)
+    ]
+
+
+def one_by_one(client, programs):
+    start = time.perf_counter()
+    results = [
+        client.post("/eval", json={"payload": payload}).get_json()["result"]
+        for payload in submissions(programs)
+    ]
+    elapsed = time.perf_counter() - start
+    assert len(set(results)) == 1, results
+    return elapsed
+
+
+def batch(client, programs):
+    start = time.perf_counter()
+    response = client.post("/eval/batch", json={"programs": submissions(programs)})
+    results = [result["result"] for result in response.get_json()["results"]]
+    elapsed = time.perf_counter() - start
+    assert len(results) == programs and len(set(results)) == 1, results
+    return elapsed
+
+
+def main():
+    programs = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    client = app.app.test_client()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        pool = app.start_worker_pool()
+        # every worker is ready before timing
+        batch(client, pool.size)
+        single = one_by_one(client, programs)
+        batched = batch(client, programs)
+    print(f"programs:   {programs}, {pool.size} workers")
+    print(f"one by one: {single:.3f}s")
+    print(f"batch:      {batched:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Calls a numeric OLCScript function with a loop from a hot loop.
+
+Runs the optimized program twice: once with hot functions compiled to Python
+after Interpreter.COMPILE_THRESHOLD calls and once with compilation disabled.
+
+    python benchmarks/function_compilation.py [iterations]
+"""
+
+import os
+import sys
+import time
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app import OLCScriptParser, GlobalContext, Interpreter, Optimizer
+
+PROGRAM = """
+function collatz(n: number): number {
+    var x: number = n;
+    var steps: number = 0;
+    while (x != 1) {
+        x = x %% 2 == 0 ? x / 2 : 3 * x + 1;
+        steps = steps + 1;
+    }
+    return steps;
+}
+var total: number = 0;
+for (var i: number = 1; i < %d; i++) {
+    total = total + collatz(i);
+}
+console.log(total);
+"""
+
+
+def run(source_code):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        parser = OLCScriptParser(source_code)
+        ast = parser.parse()
+        global_context = GlobalContext("<global>")
+        interpreter = Interpreter(parser.lexer.lexdata, global_context, "bench.olc")
+        ast = Optimizer(interpreter, global_context).optimize(ast)
+        start = time.perf_counter()
+        interpreter.visit(ast, global_context)
+        elapsed = time.perf_counter() - start
+    return elapsed, interpreter.log_as_string, len(interpreter.compiled_functions)
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    source_code = PROGRAM % iterations
+
+    threshold = Interpreter.COMPILE_THRESHOLD
+    compiled_time, result, compiled = run(source_code)
+    Interpreter.COMPILE_THRESHOLD = 0
+    try:
+        interpreted_time, expected, _ = run(source_code)
+    finally:
+        Interpreter.COMPILE_THRESHOLD = threshold
+    assert result == expected
+
+    print(f"iterations:   {iterations} ({compiled} functions compiled)")
+    print(f"compiled:     {compiled_time:.3f}s")
+    print(f"interpreted:  {interpreted_time:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
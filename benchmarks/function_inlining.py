@@ -0,0 +1,68 @@
+"""
+Calls small helper functions from a hot OLCScript loop.
+
+Runs the optimized program twice: once with the function inliner and once
+with it disabled, so every call goes through visit_CallExprNode.
+
+    python benchmarks/function_inlining.py [iterations]
+"""
+
+import os
+import sys
+import time
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app import OLCScriptParser, GlobalContext, Interpreter, Optimizer, FunctionInliner
+
+PROGRAM = """
+function max(a: number, b: number): number {
+    return a > b ? a : b;
+}
+function square(x: number): number {
+    return x * x;
+}
+var total: number = 0;
+for (var i: number = 0; i < %d; i++) {
+    total = total + square(max(i, 10));
+}
+console.log(total);
+"""
+
+
+def run(source_code):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        parser = OLCScriptParser(source_code)
+        ast = parser.parse()
+        global_context = GlobalContext("<global>")
+        interpreter = Interpreter(parser.lexer.lexdata, global_context, "bench.olc")
+        optimizer = Optimizer(interpreter, global_context)
+        ast = optimizer.optimize(ast)
+        start = time.perf_counter()
+        interpreter.visit(ast, global_context)
+        elapsed = time.perf_counter() - start
+    inlined_calls = sum("inlined call" in line for line in optimizer.report)
+    return elapsed, interpreter.log_as_string, inlined_calls
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    source_code = PROGRAM % iterations
+
+    max_size = FunctionInliner.MAX_SIZE
+    inlined_time, result, inlined_calls = run(source_code)
+    FunctionInliner.MAX_SIZE = 0
+    try:
+        called_time, expected, _ = run(source_code)
+    finally:
+        FunctionInliner.MAX_SIZE = max_size
+    assert result == expected
+
+    print(f"iterations:   {iterations} ({inlined_calls} call sites inlined)")
+    print(f"inlined:      {inlined_time:.3f}s")
+    print(f"calls:        {called_time:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Parses a large generated OLCScript program again after small edits.
+
+Times a full parse with OLCScriptParser against a DeclarationCache that has
+seen the previous version of the program: one function changed in the middle,
+and a line added at the top, which moves every declaration down.
+
+    python benchmarks/incremental_parse.py [functions]
+"""
+
+import os
+import sys
+import time
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app import OLCScriptParser, DeclarationCache
+
+FUNCTION = """
+function f%(n)d(a: number, b: float): number {
+    var total: number = %(value)d;
+    for (var i: number = 0; i < a; i++) {
+        if (i %% 3 == 0 && !(b > 2.5) || a - i * 2 >= total) {
+            total = total + (i > 10 ? i / 2 : -i) * %(n)d;
+        } else {
+            total += parseInt("4") + Math.max(a, i);
+        }
+    }
+    return total;
+}
+console.log(f%(n)d(%(n)d, 1.5));
+"""
+
+
+def program(functions, edited=None):
+    return "".join(
+        FUNCTION % {"n": n, "value": 1 if n == edited else 0} for n in range(functions)
+    )
+
+
+def timed(parse):
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        parse()
+    return time.perf_counter() - start
+
+
+def main():
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    source_code = program(functions)
+    declaration_cache = DeclarationCache()
+
+    full = timed(lambda: OLCScriptParser(source_code).parse())
+    first = timed(lambda: declaration_cache.parse(source_code))
+    edited = program(functions, edited=functions // 2)
+    one_function = timed(lambda: declaration_cache.parse(edited))
+    moved = "// a new first line\n" + edited
+    every_line = timed(lambda: declaration_cache.parse(moved))
+
+    print(f"source:        {len(source_code):>8} characters, {functions} functions")
+    print(f"full parse:    {full:.3f}s")
+    print(f"first parse:   {first:.3f}s")
+    print(f"one edited:    {one_function:.3f}s")
+    print(f"lines moved:   {every_line:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Parses a large generated OLCScript program with both front ends.
+
+Checks the PLY parser and the hand written PrattParser build the same tree
+and times them.
+
+    python benchmarks/pratt_parser.py [functions]
+"""
+
+import os
+import sys
+import time
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import ply.lex as lex
+from app import OLCScriptParser
+
+FUNCTION = """
+function f%(n)d(a: number, b: float): number {
+    var total: number = 0;
+    for (var i: number = 0; i < a; i++) {
+        if (i %% 3 == 0 && !(b > 2.5) || a - i * 2 >= total) {
+            total = total + (i > 10 ? i / 2 : -i) * %(n)d;
+        } else if (typeof a == "number") {
+            total += parseInt("4") + Math.max(a, i);
+        } else {
+            continue;
+        }
+    }
+    const values: number[] = [1, 2, 3, total];
+    switch (values.length) {
+        case 4:
+            console.log("four", values[3], f%(n)d.length);
+            break;
+        default:
+            console.log('x');
+    }
+    return total;
+}
+console.log(f%(n)d(%(n)d, 1.5));
+"""
+
+
+def parse(source_code, front_end, repeat=5):
+    # the best of a few runs
+    best = None
+    for _ in range(repeat):
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            parser = OLCScriptParser(source_code, front_end=front_end)
+            start = time.perf_counter()
+            ast = parser.parse()
+            elapsed = time.perf_counter() - start
+        assert not parser.errors
+        best = elapsed if best is None else min(best, elapsed)
+    return best, ast
+
+
+def same_tree(a, b):
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, lex.LexToken):
+        return (a.type, a.value, a.lineno, a.lexpos) == (
+            b.type,
+            b.value,
+            b.lineno,
+            b.lexpos,
+        )
+    if isinstance(a, list):
+        return len(a) == len(b) and all(same_tree(x, y) for x, y in zip(a, b))
+    if hasattr(a, "__dict__"):
+        return vars(a).keys() == vars(b).keys() and all(
+            same_tree(vars(a)[key], vars(b)[key]) for key in vars(a)
+        )
+    return a == b
+
+
+def main():
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    source_code = "".join(FUNCTION % {"n": n} for n in range(functions))
+
+    ply_time, ply_ast = parse(source_code, "ply")
+    pratt_time, pratt_ast = parse(source_code, "pratt")
+    assert same_tree(ply_ast, pratt_ast)
+
+    print(f"source:   {len(source_code)} characters, {functions} functions")
+    print(f"ply:      {ply_time:.3f}s")
+    print(f"pratt:    {pratt_time:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
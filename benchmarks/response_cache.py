@@ -0,0 +1,74 @@
+"""
+Sends a burst of identical /eval requests, like a class running the same sample.
+
+Times the burst with a ResponseCache, where the requests share one run, and
+without, where every request is made different by a comment and runs the
+program, and prints how many times the program ran in each case.
+
+    python benchmarks/response_cache.py [requests]
+"""
+
+import os
+import sys
+import time
+import threading
+import itertools
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import app
+
+from worker_pool import PROGRAM
+
+REQUEST_NUMBERS = itertools.count()
+
+
+def burst(requests, identical):
+    client = app.app.test_client()
+    results = []
+
+    def post():
+        payload = PROGRAM
+        if not identical:
+            payload = f"// request {next(REQUEST_NUMBERS)}\n{PROGRAM}"
+        response = client.post("/eval", json={"payload": payload}).get_json()
+        results.append(response["result"])
+
+    threads = [threading.Thread(target=post) for _ in range(requests)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    assert len(results) == requests and len(set(results)) == 1, results
+    return elapsed
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    runs = []
+    run_program = app.run_program
+
+    def counted_run_program(request_dict):
+        runs.append(request_dict)
+        return run_program(request_dict)
+
+    app.run_program = counted_run_program
+    # the uncached burst waits in the queue longer than a server lets it
+    app.admission_control = app.AdmissionControl(max_queued=requests, queue_timeout=60)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        burst(1, identical=False)
+        runs.clear()
+        uncached = burst(requests, identical=False)
+        uncached_runs = len(runs)
+        runs.clear()
+        cached = burst(requests, identical=True)
+    print(f"requests:   {requests}")
+    print(f"no cache:   {uncached:.3f}s, {uncached_runs} runs")
+    print(f"cache:      {cached:.3f}s, {len(runs)} runs")
+
+
+if __name__ == "__main__":
+    main()
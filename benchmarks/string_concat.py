@@ -0,0 +1,63 @@
+"""
+Builds a 1 MB string from an OLCScript loop with `s = s + "...";`.
+
+Runs the program twice: once with the rope representation of String and
+once with it disabled, so every `+` copies the whole string.
+
+    python benchmarks/string_concat.py [size_in_bytes]
+"""
+
+import os
+import sys
+import time
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app import OLCScriptParser, GlobalContext, Interpreter, String, SymtabKey
+
+PIECE = "*" * 64
+
+PROGRAM = """
+var s: string = "";
+for (var i: number = 0; i < %d; i++) {
+    s = s + "%s";
+}
+console.log(typeof s);
+"""
+
+
+def run(source_code):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        parser = OLCScriptParser(source_code)
+        ast = parser.parse()
+        global_context = GlobalContext("<global>")
+        interpreter = Interpreter(parser.lexer.lexdata, global_context, "bench.olc")
+        start = time.perf_counter()
+        interpreter.visit(ast, global_context)
+        # observe the string once, like console.log would
+        value = global_context.lookup("s").get_attribute(SymtabKey.RUNTIME_VALUE)
+        length = len(value.value)
+        elapsed = time.perf_counter() - start
+    return elapsed, length
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1024 * 1024
+    source_code = PROGRAM % (size // len(PIECE), PIECE)
+
+    threshold = String.ROPE_THRESHOLD
+    rope_time, length = run(source_code)
+    String.ROPE_THRESHOLD = float("inf")
+    try:
+        flat_time, _ = run(source_code)
+    finally:
+        String.ROPE_THRESHOLD = threshold
+
+    print(f"string size:  {length} bytes ({size // len(PIECE)} iterations)")
+    print(f"rope:         {rope_time:.3f}s")
+    print(f"flat copies:  {flat_time:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
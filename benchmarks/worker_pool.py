@@ -0,0 +1,81 @@
+"""
+Sends concurrent /eval requests with a CPU bound program.
+
+Runs them one after the other in the request thread, the way /eval runs
+without a pool, and then all at once in a WorkerPool with one worker per
+core, and prints the wall clock time of both.
+
+    python benchmarks/worker_pool.py [requests]
+"""
+
+import os
+import sys
+import time
+import threading
+import itertools
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import app
+
+PROGRAM = """
+function collatz(n: number): number {
+    var x: number = n;
+    var steps: number = 0;
+    while (x != 1) {
+        x = x % 2 == 0 ? x / 2 : 3 * x + 1;
+        steps = steps + 1;
+    }
+    return steps;
+}
+var total: number = 0;
+for (var i: number = 1; i < 300; i++) {
+    total = total + collatz(i);
+}
+console.log(total);
+"""
+REQUEST_NUMBERS = itertools.count()
+
+
+def send(requests, concurrently):
+    client = app.app.test_client()
+    results = []
+
+    def post():
+        # a different comment on every request, the responses are not cached
+        payload = f"// request {next(REQUEST_NUMBERS)}\n{PROGRAM}"
+        response = client.post("/eval", json={"payload": payload}).get_json()
+        results.append(response["result"])
+
+    start = time.perf_counter()
+    if concurrently:
+        threads = [threading.Thread(target=post) for _ in range(requests)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    else:
+        for _ in range(requests):
+            post()
+    elapsed = time.perf_counter() - start
+    assert len(set(results)) == 1, results
+    return elapsed
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        send(1, concurrently=False)
+        inline = send(requests, concurrently=False)
+        pool = app.start_worker_pool()
+        # every worker is ready before timing
+        send(pool.size, concurrently=True)
+        pooled = send(requests, concurrently=True)
+    print(f"requests:   {requests}, {pool.size} workers")
+    print(f"inline:     {inline:.3f}s")
+    print(f"pool:       {pooled:.3f}s")
+
+
+if __name__ == "__main__":
+    main()